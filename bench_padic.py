@@ -0,0 +1,350 @@
+# Benchmarks of public entry points of padic.py over small and large primes and precisions.
+# Usage:
+#   python bench_padic.py                                  run everything, print a table
+#   python bench_padic.py --json out.json                  also store results as JSON
+#   python bench_padic.py --baseline out.json              compare with stored results, exit with 1
+#                                                          if anything got slower than --threshold
+#   python bench_padic.py --filter exp --precisions 32 256 run selected cases only
+#   python bench_padic.py --filter --import-time            measure import time only
+from __future__ import annotations
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from typing import Callable
+import padic
+from padic import Padic, PadicPolynomial, PadicMatrix
+
+PRIMES: list[int] = [2, 7, 1009]
+PRECISIONS: list[int] = [32, 256, 1024, 10000]
+
+# Benchmark cases by name. Each one takes p and N and returns function to be timed.
+CASES: dict[str, Callable[[int, int], Callable[[], object]]] = {}
+
+
+def case(name: str) -> Callable[[Callable], Callable]:
+    def decorator(f: Callable) -> Callable:
+        CASES[name] = f
+        return f
+    return decorator
+
+
+# Pseudo-random unit known up to O(p^N), the same for given p and N in every run.
+def _unit(p: int, N: int, seed: int = 1) -> Padic:
+    b = 1000003 + 2 * seed
+    assert b % p
+    return Padic.from_int(pow(b, 10 * N + 7, p ** N), p, N)
+
+
+@case('construct')
+def _construct(p: int, N: int) -> Callable[[], object]:
+    s = _unit(p, N).s
+    return lambda: Padic(N, 3, s, p)
+
+
+@case('from_int')
+def _from_int(p: int, N: int) -> Callable[[], object]:
+    a = p ** 5 * _unit(p, N).s
+    return lambda: Padic.from_int(a, p, N)
+
+
+@case('from_frac')
+def _from_frac(p: int, N: int) -> Callable[[], object]:
+    return lambda: Padic.from_frac(123456789, 987654323, p, N)
+
+
+@case('add')
+def _add(p: int, N: int) -> Callable[[], object]:
+    x, y = _unit(p, N, 1), _unit(p, N, 2) << 2
+    return lambda: x + y
+
+
+@case('sub')
+def _sub(p: int, N: int) -> Callable[[], object]:
+    x, y = _unit(p, N, 1), _unit(p, N, 2)
+    return lambda: x - y
+
+
+@case('neg')
+def _neg(p: int, N: int) -> Callable[[], object]:
+    x = _unit(p, N)
+    return lambda: -x
+
+
+@case('mul')
+def _mul(p: int, N: int) -> Callable[[], object]:
+    x, y = _unit(p, N, 1), _unit(p, N, 2)
+    return lambda: x * y
+
+
+@case('truediv')
+def _truediv(p: int, N: int) -> Callable[[], object]:
+    x, y = _unit(p, N, 1), _unit(p, N, 2)
+    return lambda: x / y
+
+
+@case('pow')
+def _pow(p: int, N: int) -> Callable[[], object]:
+    x = _unit(p, N)
+    return lambda: x ** 100
+
+
+@case('rtruediv')
+def _rtruediv(p: int, N: int) -> Callable[[], object]:
+    x = _unit(p, N)
+    return lambda: 1 / x
+
+
+@case('mod')
+def _mod(p: int, N: int) -> Callable[[], object]:
+    x = _unit(p, N)
+    m = p ** (N // 2)
+    return lambda: x % m
+
+
+@case('floordiv')
+def _floordiv(p: int, N: int) -> Callable[[], object]:
+    x = _unit(p, N)
+    m = p ** (N // 2)
+    return lambda: x // m
+
+
+@case('lshift')
+def _lshift(p: int, N: int) -> Callable[[], object]:
+    x = _unit(p, N)
+    return lambda: x << 5
+
+
+@case('rshift')
+def _rshift(p: int, N: int) -> Callable[[], object]:
+    x = _unit(p, N)
+    return lambda: x >> 5
+
+
+@case('eq')
+def _eq(p: int, N: int) -> Callable[[], object]:
+    x, y = _unit(p, N), _unit(p, N)
+    return lambda: x == y
+
+
+@case('val')
+def _val(p: int, N: int) -> Callable[[], object]:
+    n = p ** N * 12345
+    return lambda: Padic.val(n, p)
+
+
+@case('str')
+def _str(p: int, N: int) -> Callable[[], object]:
+    x = _unit(p, N)
+
+    def f():
+        prev, Padic.DISPLAY_PRECISION = Padic.DISPLAY_PRECISION, None
+        out = str(x)
+        Padic.DISPLAY_PRECISION = prev
+        return out
+    return f
+
+
+@case('from_string')
+def _from_string(p: int, N: int) -> Callable[[], object]:
+    x = _unit(p, N)
+    string = format(x, 'exact').split(' + ')[0]
+    return lambda: Padic.from_string(string, p)
+
+
+@case('series')
+def _series(p: int, N: int) -> Callable[[], object]:
+    x = Padic.from_int(p, p, N)
+    f = padic.series(lambda k: k + 1, 20)
+    return lambda: f(x)
+
+
+@case('exp')
+def _exp(p: int, N: int) -> Callable[[], object]:
+    x = Padic.from_int(4 if p == 2 else p, p, N) * _unit(p, N)
+    return lambda: padic.exp(x, digits=N)
+
+
+@case('log')
+def _log(p: int, N: int) -> Callable[[], object]:
+    x = 1 + Padic.from_int(4 if p == 2 else p, p, N) * _unit(p, N)
+    return lambda: padic.log(x, digits=N)
+
+
+@case('sin')
+def _sin(p: int, N: int) -> Callable[[], object]:
+    x = Padic.from_int(4 if p == 2 else p, p, N) * _unit(p, N)
+    return lambda: padic.sin(x, digits=N)
+
+
+@case('cos')
+def _cos(p: int, N: int) -> Callable[[], object]:
+    x = Padic.from_int(4 if p == 2 else p, p, N) * _unit(p, N)
+    return lambda: padic.cos(x, digits=N)
+
+
+@case('binomial')
+def _binomial(p: int, N: int) -> Callable[[], object]:
+    x = Padic.from_int(4 if p == 2 else p, p, N) * _unit(p, N)
+    return lambda: padic.binomial(1 + x, Padic.from_frac(1, 3 if p == 2 else 2, p, N), digits=N)
+
+
+@case('binomial_coeff')
+def _binomial_coeff(p: int, N: int) -> Callable[[], object]:
+    a = _unit(p, N)
+
+    def f():
+        padic.cache_clear('binomial_coefficients')
+        return padic.binomial_coeff(a, 50, p)
+    return f
+
+
+# x^2 + x - (p + 2) has two simple irrational roots congruent to 1 and -2 modulo p.
+@case('find_approx_root')
+def _find_approx_root(p: int, N: int) -> Callable[[], object]:
+    poly = PadicPolynomial([-(p + 2), 1, 1], p)
+    return lambda: padic.find_approx_root(poly)
+
+
+@case('hensel')
+def _hensel(p: int, N: int) -> Callable[[], object]:
+    poly = PadicPolynomial([-(p + 2), 1, 1], p)
+    return lambda: padic.hensel(poly, 1, digits=N)
+
+
+# 20x20 matrix with entries pseudo-random modulo p^N, the same for given p and N in every run.
+def _matrix(p: int, N: int, rows: int = 20, cols: int = 20) -> PadicMatrix:
+    rng = random.Random(rows * cols)
+    return PadicMatrix(rows, cols, N, 0, [rng.randrange(p ** N) for _ in range(rows * cols)], p)
+
+
+@case('solve')
+def _solve(p: int, N: int) -> Callable[[], object]:
+    a, b = _matrix(p, N), _matrix(p, N, cols=1)
+    return lambda: a.solve(b)
+
+
+@case('det')
+def _det(p: int, N: int) -> Callable[[], object]:
+    a = _matrix(p, N)
+    return lambda: a.det()
+
+
+# Best time of a single call (in seconds) over repeats, each repeat lasting at least min_time.
+def measure(f: Callable[[], object], min_time: float, repeats: int) -> tuple[float, int]:
+    start = time.perf_counter()
+    f()
+    elapsed = time.perf_counter() - start
+    number = 1
+    # Slow cases are not run again just to find number of calls
+    while elapsed < min_time:
+        start = time.perf_counter()
+        for _ in range(number):
+            f()
+        elapsed = time.perf_counter() - start
+        if elapsed < min_time:
+            number *= 10 if elapsed < min_time / 10 else 2
+    best = elapsed / number
+    for _ in range(repeats - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            f()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best, number
+
+
+# Precisions for which a single call is expected to take more than max_call seconds (assuming
+# time grows quadratically with N) are skipped.
+def run(names: list[str], primes: list[int], precisions: list[int], min_time: float, repeats: int,
+        max_call: float | None = None) -> dict:
+    results = {}
+    for name in names:
+        for p in primes:
+            last = None
+            for N in sorted(precisions):
+                key = f'{name}[p={p},N={N}]'
+                if max_call is not None and last is not None and last[1] * (N / last[0]) ** 2 > max_call:
+                    print(f'{key:40} {"skipped":>17}', flush=True)
+                    continue
+                padic.cache_clear()
+                seconds, number = measure(CASES[name](p, N), min_time, repeats)
+                results[key] = {'case': name, 'p': p, 'N': N, 'seconds': seconds, 'number': number}
+                print(f'{key:40} {seconds * 1e6:14.2f} us', flush=True)
+                last = N, seconds
+    return results
+
+
+# Time of importing padic in a fresh interpreter, best of repeats. Cumulative time reported by
+# -X importtime is used, so interpreter startup isn't counted. Bytecode is written by a warm-up
+# run (even if the environment disables it), otherwise compilation would be measured.
+def import_time(repeats: int) -> float:
+    env = {k: v for k, v in os.environ.items() if k != 'PYTHONDONTWRITEBYTECODE'}
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    best = None
+    for i in range(repeats + 1):
+        out = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import padic'], env=env, cwd=cwd,
+                             capture_output=True, text=True, check=True)
+        fields = [line.split('|') for line in out.stderr.splitlines()]
+        seconds = next(int(f[1]) for f in fields if len(f) == 3 and f[2].strip() == 'padic') / 1e6
+        if i > 0:
+            best = seconds if best is None else min(best, seconds)
+    return best
+
+
+# Returns keys of cases which got slower than threshold times the baseline.
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    slower = []
+    for key, r in results.items():
+        if key not in baseline:
+            continue
+        ratio = r['seconds'] / baseline[key]['seconds']
+        mark = ' SLOWER' if ratio > threshold else ' faster' if ratio < 1 / threshold else ''
+        print(f'{key:40} {ratio:8.2f}x{mark}')
+        if ratio > threshold:
+            slower.append(key)
+    return slower
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmarks of padic.py')
+    parser.add_argument('--filter', nargs='*', default=None, help='names of cases to run (default: all)')
+    parser.add_argument('--primes', nargs='*', type=int, default=PRIMES)
+    parser.add_argument('--precisions', nargs='*', type=int, default=PRECISIONS)
+    parser.add_argument('--min-time', type=float, default=0.1, help='minimal duration of a single repeat')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--max-call', type=float, default=10.0,
+                        help='skip precisions for which a call would take longer (in seconds, 0 to never skip)')
+    parser.add_argument('--import-time', action='store_true', help='also measure time of importing padic')
+    parser.add_argument('--json', help='file to store results in')
+    parser.add_argument('--baseline', help='JSON file with results to compare with')
+    parser.add_argument('--threshold', type=float, default=1.25, help='allowed slowdown ratio')
+    args = parser.parse_args(argv)
+    names = list(CASES) if args.filter is None else args.filter
+    unknown = [name for name in names if name not in CASES]
+    if unknown:
+        parser.error(f'unknown cases: {", ".join(unknown)}')
+    results = run(names, args.primes, args.precisions, args.min_time, args.repeats, args.max_call or None)
+    if args.import_time:
+        seconds = import_time(max(args.repeats, 5))
+        results['import'] = {'case': 'import', 'p': None, 'N': None, 'seconds': seconds, 'number': 1}
+        print(f'{"import":40} {seconds * 1e6:14.2f} us', flush=True)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(),
+                       'results': results}, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        slower = compare(results, baseline, args.threshold)
+        if slower:
+            print(f'{len(slower)} case(s) slower than baseline: {", ".join(slower)}')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
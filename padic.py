@@ -1,15 +1,447 @@
 # Version 0.2.4
 from __future__ import annotations
-from typing import Callable
-from numpy import base_repr
-from numpy.polynomial import Polynomial
-from functools import lru_cache
-import sys
+from functools import lru_cache, wraps
+from contextlib import contextmanager
+from time import perf_counter
+from itertools import chain
+from operator import mul as _int_mul
+from math import factorial as _math_factorial, log as _ln, gcd as _math_gcd, isqrt
+from fractions import Fraction
+
+# Names used only in annotations (which aren't evaluated) are not imported at runtime: numpy is
+# needed only by users passing numpy polynomials and typing alone takes longer to import than
+# the rest of the module. See bench_padic.py --import-time.
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Callable
+    from numpy.polynomial import Polynomial
+
+# Caches used by the module, mapped to names of lru_cache wrapped functions implementing them.
+# Tables of values for fixed p and precision are stored as lists growing on demand.
+# See cache_info, cache_clear and set_cache_size.
+_CACHES: dict[str, str] = {}
+
+
+def _cached(name: str, maxsize: int | None) -> Callable[[Callable], Callable]:
+    def decorator(f: Callable) -> Callable:
+        _CACHES[name] = f.__name__
+        return lru_cache(maxsize=maxsize)(f)
+    return decorator
+
+
+# Returns dictionary of hit/miss statistics of caches by name.
+def cache_info() -> dict[str, tuple[int, int, int | None, int]]:
+    return {name: globals()[f].cache_info() for name, f in _CACHES.items()}
+
+
+# Clears given cache or all of them if name is None.
+def cache_clear(name: str | None = None) -> None:
+    for f in _CACHES.values() if name is None else [_CACHES[name]]:
+        globals()[f].cache_clear()
+
+
+# Changes maximal number of entries (or tables) stored in given cache, or in all of them if name is None.
+# Cache content is dropped.
+def set_cache_size(maxsize: int | None, name: str | None = None) -> None:
+    for f in _CACHES.values() if name is None else [_CACHES[name]]:
+        globals()[f] = lru_cache(maxsize=maxsize)(globals()[f].__wrapped__)
+
+
+# Opt-in instrumentation. While it's enabled, calls of Padic methods listed below and of module
+# functions decorated with _traced are counted, timed (including nested calls) and sizes of their
+# Padic arguments are recorded: N - v and bit length of s, bucketed by powers of two. Methods are
+# replaced by wrappers only while instrumentation is on, so arithmetic has no overhead at all
+# when it's off. Not thread-safe, worker processes of parallel_map are not instrumented.
+_INSTRUMENTED_METHODS: list[str] = ['__init__', '__add__', '__sub__', '__neg__', '__mul__', '__truediv__',
+                                    '__rtruediv__', '__pow__', '__eq__', '__mod__', '__str__', 'with_precision',
+                                    'from_int', 'from_frac', 'from_string', 'val']
+_STATS: dict[str, dict] = {}
+_ORIGINALS: dict[str, Callable] = {}
+_instrumentation_depth: int = 0
+
+
+def _bucket(n: int) -> int:
+    return 1 << n.bit_length() - 1 if n > 0 else 0
+
+
+def _record(name: str, seconds: float, args: tuple) -> None:
+    stats = _STATS.get(name)
+    if stats is None:
+        stats = _STATS[name] = {'count': 0, 'seconds': 0.0, 'digits': {}, 'bits': {}}
+    stats['count'] += 1
+    stats['seconds'] += seconds
+    for a in args:
+        # Arguments of failed __init__ may be left without attributes
+        if isinstance(a, Padic) and hasattr(a, 's'):
+            d, b = _bucket(a.N - a.v), _bucket(a.s.bit_length())
+            stats['digits'][d] = stats['digits'].get(d, 0) + 1
+            stats['bits'][b] = stats['bits'].get(b, 0) + 1
+
+
+def _instrument(name: str, f: Callable) -> Callable:
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        start = perf_counter()
+        try:
+            return f(*args, **kwargs)
+        finally:
+            _record(name, perf_counter() - start, args)
+    return wrapper
+
+
+# For high-level functions (which can be imported by name, so can't be swapped) instrumentation
+# costs a single check when it's off.
+def _traced(f: Callable) -> Callable:
+    name = f.__name__
+
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        if not _instrumentation_depth:
+            return f(*args, **kwargs)
+        start = perf_counter()
+        try:
+            return f(*args, **kwargs)
+        finally:
+            _record(name, perf_counter() - start, args)
+    return wrapper
+
+
+# Calls can be nested, instrumentation stays on until every enable has its disable.
+def enable_instrumentation() -> None:
+    global _instrumentation_depth
+    _instrumentation_depth += 1
+    if _instrumentation_depth > 1:
+        return
+    for name in _INSTRUMENTED_METHODS:
+        original = Padic.__dict__[name]
+        _ORIGINALS[name] = original
+        if isinstance(original, staticmethod):
+            setattr(Padic, name, staticmethod(_instrument('Padic.' + name, original.__func__)))
+        else:
+            setattr(Padic, name, _instrument('Padic.' + name, original))
+
+
+def disable_instrumentation() -> None:
+    global _instrumentation_depth
+    if _instrumentation_depth == 0:
+        return
+    _instrumentation_depth -= 1
+    if _instrumentation_depth > 0:
+        return
+    for name, original in _ORIGINALS.items():
+        setattr(Padic, name, original)
+    _ORIGINALS.clear()
+
+
+# Copy of collected statistics: for every instrumented name number of calls, total time in seconds
+# and histograms {bucket: count} of 'digits' (N - v) and 'bits' (bit length of s) of Padic arguments.
+def instrumentation_snapshot() -> dict[str, dict]:
+    return {name: {'count': stats['count'], 'seconds': stats['seconds'],
+                   'digits': dict(stats['digits']), 'bits': dict(stats['bits'])} for name, stats in _STATS.items()}
+
+
+def instrumentation_reset() -> None:
+    _STATS.clear()
+
+
+# with instrumented(): ... collects statistics of the block (dropping previous ones if reset).
+@contextmanager
+def instrumented(reset: bool = True):
+    if reset:
+        instrumentation_reset()
+    enable_instrumentation()
+    try:
+        yield
+    finally:
+        disable_instrumentation()
+
+
+# Binary format. Non-negative integers are stored as LEB128 varints, N and v are zigzag encoded
+# first and s is stored as its byte length followed by little-endian bytes. Single number is
+# p, N, v, s; stream written by write_padics is _STREAM_MAGIC, p and then N, v, s of every number.
+_STREAM_MAGIC: bytes = b'PADIC\x01'
+_WRITE_BUFFER: int = 1 << 20
+
+
+def _write_varint(out: bytearray, n: int) -> None:
+    while n >= 0x80:
+        out.append(n & 0x7f | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+# Works for bytes, bytearray, memoryview and mmap. Returns value and position after it.
+def _read_varint(data, pos: int) -> tuple[int, int]:
+    b = data[pos]
+    if b < 0x80:
+        return b, pos + 1
+    n, shift = 0, 0
+    while b >= 0x80:
+        n |= (b & 0x7f) << shift
+        shift += 7
+        pos += 1
+        b = data[pos]
+    return n | b << shift, pos + 1
+
+
+def _write_record(out: bytearray, N: int, v: int, s: int) -> None:
+    _write_varint(out, N << 1 if N >= 0 else -N << 1 | 1)
+    _write_varint(out, v << 1 if v >= 0 else -v << 1 | 1)
+    k = (s.bit_length() + 7) >> 3
+    _write_varint(out, k)
+    out += s.to_bytes(k, 'little')
+
+
+def _read_record(data, pos: int) -> tuple[int, int, int, int]:
+    N, pos = _read_varint(data, pos)
+    v, pos = _read_varint(data, pos)
+    k, pos = _read_varint(data, pos)
+    s = int.from_bytes(data[pos:pos + k], 'little')
+    return -(N >> 1) if N & 1 else N >> 1, -(v >> 1) if v & 1 else v >> 1, s, pos + k
+
+
+# Writes p-adic numbers (all with the same prime) to binary file in chunks. Returns number of
+# written values.
+def write_padics(file, values, p: int | None = None) -> int:
+    values = iter(values)
+    first = next(values, None)
+    if p is None:
+        p = Padic.DEFAULT_PRIME if first is None else first.p
+    out = bytearray(_STREAM_MAGIC)
+    _write_varint(out, p)
+    count = 0
+    for x in chain([first], values) if first is not None else []:
+        if x.p != p:
+            raise RuntimeError(f"Can't write {x} to stream of {p}-adic numbers")
+        _write_record(out, x.N, x.v, x.s)
+        count += 1
+        if len(out) >= _WRITE_BUFFER:
+            file.write(out)
+            out.clear()
+    file.write(out)
+    return count
+
+
+# Reads stream written by write_padics. data can be bytes, memoryview or mmap of a file,
+# numbers are decoded lazily.
+def read_padics(data):
+    p, pos = _read_stream_header(data)
+    while pos < len(data):
+        N, v, s, pos = _read_record(data, pos)
+        yield Padic._make(N, v, s, p)
+
+
+def _read_stream_header(data) -> tuple[int, int]:
+    if bytes(data[:len(_STREAM_MAGIC)]) != _STREAM_MAGIC:
+        raise RuntimeError("Not a stream of p-adic numbers")
+    return _read_varint(data, len(_STREAM_MAGIC))
+
+
+def _unpickle_padic(data: bytes) -> Padic:
+    return Padic.from_bytes(data)
+
+
+@_cached('powers', 4096)
+def _p_power(p: int, k: int) -> int:
+    return p ** k
+
+
+# Returns v, u such that n = p^v * u and u is not divisible by p. Assumes n != 0.
+# Divides by p, p^2, p^4, ... as long as possible and then by the same powers in reverse
+# order, so that only O(log v) big divisions are needed.
+def _remove_python(n: int, p: int) -> tuple[int, int]:
+    if p == 2:
+        v = (n & -n).bit_length() - 1
+        return v, n >> v
+    if n % p:
+        return 0, n
+    v = 0
+    k = 0
+    while True:
+        q, r = divmod(n, _p_power(p, 1 << k))
+        if r:
+            break
+        n = q
+        v += 1 << k
+        k += 1
+    for i in range(k - 1, -1, -1):
+        q, r = divmod(n, _p_power(p, 1 << i))
+        if not r:
+            n = q
+            v += 1 << i
+    return v, n
+
+
+# Big-integer backend. Hot primitives of the arithmetic core (modular inverse, modular power,
+# multiplication modulo a power of p and removal of factors p) go through the module level
+# names below, which set_backend rebinds. Every backend takes and returns plain ints, so
+# results (and everything stored in Padic) are identical whichever one is used.
+def _invert_python(a: int, m: int) -> int:
+    return pow(a, -1, m)
+
+
+def _powmod_python(a: int, e: int, m: int) -> int:
+    return pow(a, e, m)
+
+
+def _mulmod_python(a: int, b: int, m: int) -> int:
+    return a * b % m
+
+
+# GMP multiplies faster than CPython from about this many bits on. Smaller products aren't worth
+# conversions to mpz and back.
+_GMPY2_MUL_BITS: int = 4096
+_gmpy2 = None
+
+
+def _invert_gmpy2(a: int, m: int) -> int:
+    if m == 1:
+        return 0
+    try:
+        return int(_gmpy2.invert(a, m))
+    except ZeroDivisionError:
+        raise ValueError("base is not invertible for the given modulus") from None
+
+
+def _powmod_gmpy2(a: int, e: int, m: int) -> int:
+    if e < 0:
+        return int(_gmpy2.powmod(_invert_gmpy2(a, m), -e, m))
+    return int(_gmpy2.powmod(a, e, m))
+
+
+def _mulmod_gmpy2(a: int, b: int, m: int) -> int:
+    if m.bit_length() < _GMPY2_MUL_BITS:
+        return a * b % m
+    return int(_gmpy2.mpz(a) * b % m)
+
+
+def _remove_gmpy2(n: int, p: int) -> tuple[int, int]:
+    u, v = _gmpy2.remove(n, p)
+    return v, int(u)
+
+
+_BACKENDS: dict[str, tuple[Callable, Callable, Callable, Callable]] = {
+    'python': (_invert_python, _powmod_python, _mulmod_python, _remove_python),
+    'gmpy2': (_invert_gmpy2, _powmod_gmpy2, _mulmod_gmpy2, _remove_gmpy2),
+}
+_backend: str = 'python'
+_invert, _powmod, _mulmod, _remove = _BACKENDS[_backend]
+
+
+# Selects big-integer backend: 'python' (default) or 'gmpy2' (requires gmpy2 package).
+def set_backend(name: str) -> None:
+    global _gmpy2, _backend, _invert, _powmod, _mulmod, _remove
+    if name not in _BACKENDS:
+        raise RuntimeError(f"Unknown backend {name}, available: {', '.join(_BACKENDS)}")
+    if name == 'gmpy2' and _gmpy2 is None:
+        try:
+            import gmpy2
+        except ImportError:
+            raise RuntimeError("Backend gmpy2 requires gmpy2 package") from None
+        _gmpy2 = gmpy2
+    _backend = name
+    _invert, _powmod, _mulmod, _remove = _BACKENDS[name]
+
+
+def get_backend() -> str:
+    return _backend
+
+
+# Radix conversion. Numbers are split in halves by cached powers p^(2^k), so conversion of n digits
+# costs a few multiplications (divisions) of n-digit numbers instead of n operations on them.
+# Blocks of at most _RADIX_LEAF digits are converted digit by digit.
+_RADIX_LEAF: int = 64
+_DIGITS: str = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+_DIGIT_VALUES: dict[str, int] = {c: i for i, c in enumerate(_DIGITS)}
+
+
+# Appends exactly length digits of n (most significant first) to out. Assumes 0 <= n < p^length.
+def _to_digits(n: int, p: int, length: int, out: list[int]) -> None:
+    if length <= _RADIX_LEAF:
+        digits = [0] * length
+        for i in range(length - 1, -1, -1):
+            n, digits[i] = divmod(n, p)
+        out.extend(digits)
+        return
+    half = 1 << (length - 1).bit_length() - 1
+    high, low = divmod(n, _p_power(p, half))
+    _to_digits(high, p, length - half, out)
+    _to_digits(low, p, half, out)
+
+
+# Number with digits[start:end] (most significant first) in base p.
+def _from_digits(digits: list[int], p: int, start: int = 0, end: int | None = None) -> int:
+    if end is None:
+        end = len(digits)
+    if end - start <= _RADIX_LEAF:
+        n = 0
+        for i in range(start, end):
+            n = n * p + digits[i]
+        return n
+    half = 1 << (end - start - 1).bit_length() - 1
+    return _from_digits(digits, p, start, end - half) * _p_power(p, half) + _from_digits(digits, p, end - half, end)
+
+
+# Digits of n > 0 without leading zeros.
+def _digits(n: int, p: int) -> list[int]:
+    if p == 2:
+        return [1 if c == '1' else 0 for c in format(n, 'b')]
+    length = n.bit_length() * 0.6931471805599453 / _ln(p)
+    length = int(length) + 1
+    while length > 1 and _p_power(p, length - 1) > n:
+        length -= 1
+    while _p_power(p, length) <= n:
+        length += 1
+    out = []
+    _to_digits(n, p, length, out)
+    return out
+
+
+# Digits of n >= 0 as a string. For p > 36 digits are written in decimal and separated by commas.
+def _digit_string(n: int, p: int) -> str:
+    if n == 0:
+        return '0'
+    if p == 2:
+        return format(n, 'b')
+    if p <= 36:
+        return ''.join([_DIGITS[d] for d in _digits(n, p)])
+    return ','.join(map(str, _digits(n, p)))
+
+
+# N limited by target precision (with guard digits) if it's set.
+def _capped(N: int) -> int:
+    if Padic.TARGET_PRECISION is None:
+        return N
+    return min(N, Padic.TARGET_PRECISION + Padic.GUARD_DIGITS)
+
 
-sys.setrecursionlimit(2000)
+# Precision limit applied by _capped, None if there's none. Part of keys of cached tables, so that
+# values computed inside target_precision aren't reused after it (and the other way around).
+def _cap() -> int | None:
+    if Padic.TARGET_PRECISION is None:
+        return None
+    return Padic.TARGET_PRECISION + Padic.GUARD_DIGITS
+
+
+# with target_precision(N): ... computes everything in the block only up to O(p^(N + guard_digits)),
+# so results are known up to O(p^N) unless divisions by multiples of p ate more than the guard.
+@contextmanager
+def target_precision(N: int, guard_digits: int | None = None):
+    prev = Padic.TARGET_PRECISION, Padic.GUARD_DIGITS
+    Padic.TARGET_PRECISION = N
+    if guard_digits is not None:
+        Padic.GUARD_DIGITS = guard_digits
+    try:
+        yield
+    finally:
+        Padic.TARGET_PRECISION, Padic.GUARD_DIGITS = prev
 
 
 class Padic:
+    # Instance layout. Padic takes 64 bytes (64-bit CPython 3.11) plus its significand s, compared to
+    # about 100 bytes with per-instance __dict__. Instances are never modified by operations.
+    __slots__ = ('N', 'v', 's', 'p')
+
     # Numbers are compared modulo p**PRECISION. Doesn't affect precision of computations.
     PRECISION: int = 32
 
@@ -26,27 +458,71 @@ class Padic:
     # If set to None displays all of them. Should be non-negative.
     DISPLAY_PRECISION: int | None = None
 
+    # Precision of final results declared up front (see target_precision). If set, no number is
+    # computed beyond O(p^(TARGET_PRECISION + GUARD_DIGITS)), so intermediate values stay bounded
+    # instead of carrying INTEGER_PRECISION or more digits through long computations. Precision
+    # is still tracked exactly, GUARD_DIGITS absorb losses in divisions by numbers divisible by p.
+    TARGET_PRECISION: int | None = None
+    GUARD_DIGITS: int = 8
+
     # Represents p-adic number as an interval p^v*s + O(p^N)
     def __init__(self, N: int, v: int, s: int, p: int | None = None) -> None:
         if p is None:
             p = Padic.DEFAULT_PRIME
         # Assumes p is prime
         # Assumes s _|_ p or s == 0
+        if Padic.TARGET_PRECISION is not None and N > Padic.TARGET_PRECISION + Padic.GUARD_DIGITS:
+            N = Padic.TARGET_PRECISION + Padic.GUARD_DIGITS
         if v >= N:
             s = 0
         if s == 0:
             v = N
         self.N: int = N
         self.v: int = v
-        self.s: int = s % p ** (N - v)
+        self.s: int = s % _p_power(p, N - v)
         self.p: int = p
 
+    # Fast path constructor for internal use. Skips normalization, so s has to be already reduced
+    # modulo p^(N - v) and v == N has to hold iff s == 0.
+    @staticmethod
+    def _make(N: int, v: int, s: int, p: int) -> Padic:
+        out = object.__new__(Padic)
+        out.N = N
+        out.v = v
+        out.s = s
+        out.p = p
+        return out
+
     def __abs__(self) -> int | float:
         return self.p ** (-self.v)
 
+    # Numbers are equal if they agree modulo p^k for k = min(PRECISION, N of both), i.e. if their
+    # difference is 0 + O(p^k). Compared directly on v and s, without computing the difference.
+    # Numbers with different primes are never equal.
     def __eq__(self, other: Padic | int) -> bool:
-        diff = self - other
-        return diff.v >= Padic.PRECISION or diff.v == diff.N
+        if isinstance(other, int) or isinstance(other, float) and other == 0.0:
+            if other == 0:
+                return self.v >= _capped(min(Padic.PRECISION, self.N))
+            other = Padic.from_int(other, self.p, self.N)
+        elif not isinstance(other, Padic):
+            return NotImplemented
+        elif self.p != other.p:
+            return False
+        k = _capped(min(Padic.PRECISION, self.N, other.N))
+        if self.v >= k or other.v >= k:
+            return self.v >= k and other.v >= k
+        return self.v == other.v and (self.s - other.s) % _p_power(self.p, k - self.v) == 0
+
+    # Canonical form of the number compared up to O(p^digits) (by default PRECISION, capped under
+    # target_precision like ==): numbers equal at this precision have equal keys. Numbers known to less than digits keep N in the
+    # key, so they share it only with numbers with the same N and digits.
+    def key(self, digits: int | None = None) -> tuple[int, ...]:
+        k = _capped(Padic.PRECISION) if digits is None else digits
+        if self.N < k:
+            return self.p, self.N, self.v, self.s
+        if self.v >= k:
+            return self.p, k
+        return self.p, k, self.v, self.s % _p_power(self.p, k - self.v)
 
     def __add__(self, other: Padic | int | float) -> Padic:
         if isinstance(other, float) and other == 0.0:
@@ -54,14 +530,15 @@ class Padic:
         if isinstance(other, Padic) and self.p == other.p:
             v_diff = self.v - other.v
             if v_diff > 0:
-                return Padic(min(self.N, other.N), other.v, (self.p ** v_diff) * self.s + other.s, self.p)
+                return Padic(min(self.N, other.N), other.v, _p_power(self.p, v_diff) * self.s + other.s, self.p)
             if v_diff < 0:
-                return Padic(min(self.N, other.N), self.v, self.s + (self.p ** (-v_diff)) * other.s, self.p)
+                return Padic(min(self.N, other.N), self.v, self.s + _p_power(self.p, -v_diff) * other.s, self.p)
             return Padic.from_int(self.s + other.s, self.p, min(self.N, other.N), self.v)
         if isinstance(other, int):
             return self + Padic.from_int(other, self.p, self.N)
-        else:
-            raise RuntimeError(f"Can't add {str(self)} to {str(other)}")
+        if isinstance(other, PadicArray):
+            return NotImplemented
+        raise RuntimeError(f"Can't add {str(self)} to {str(other)}")
 
     # This may look weird. That's a bypass to make class work with evaluation of numpy polynomials
     def __radd__(self, other: int | float) -> Padic:
@@ -70,7 +547,7 @@ class Padic:
         return self + other
 
     def __neg__(self) -> Padic:
-        return Padic(self.N, self.v, -self.s, self.p)
+        return Padic._make(self.N, self.v, _p_power(self.p, self.N - self.v) - self.s if self.s else 0, self.p)
 
     def __sub__(self, other: Padic | int) -> Padic:
         return self + (-other)
@@ -82,11 +559,16 @@ class Padic:
         if isinstance(other, float) and other == 1.0:
             return self
         if isinstance(other, Padic) and self.p == other.p:
-            return Padic(min(self.v + other.N, other.v + self.N), self.v + other.v, self.s * other.s, self.p)
+            N = _capped(min(self.v + other.N, other.v + self.N))
+            v = self.v + other.v
+            if v >= N:
+                return Padic._make(N, N, 0, self.p)
+            return Padic._make(N, v, _mulmod(self.s, other.s, _p_power(self.p, N - v)), self.p)
         if isinstance(other, int):
             return self * Padic.from_int(other, self.p, self.N + Padic.val(other, self.p) - Padic.val(self))
-        else:
-            raise RuntimeError(f"Can't multiply {self} with {other}")
+        if isinstance(other, PadicArray):
+            return NotImplemented
+        raise RuntimeError(f"Can't multiply {self} with {other}")
 
     # This may look weird. That's a bypass to make class work with evaluation of numpy polynomials
     def __rmul__(self, other: int | float) -> Padic:
@@ -96,23 +578,46 @@ class Padic:
 
     def __truediv__(self, other: Padic | int) -> Padic:
         if isinstance(other, Padic) and self.p == other.p:
-            N = min(self.v + other.N - 2 * other.v, self.N - other.v)
+            # Quotient by a number which is 0 only because of target precision would be meaningless
+            cap = _cap()
+            if other.s == 0 and cap is not None and other.N >= cap:
+                raise RuntimeError(f"Can't divide by 0 + O({self.p}^{other.N}) under target precision, "
+                                   f"increase guard digits")
+            N = _capped(min(self.v + other.N - 2 * other.v, self.N - other.v))
             v = self.v - other.v
-            s = self.s * pow(other.s, -1, self.p ** (N - v))
+            if v >= N:
+                return Padic._make(N, N, 0, self.p)
+            m = _p_power(self.p, N - v)
+            s = _mulmod(self.s, _invert(other.s, m), m)
             return Padic(N, v, s, self.p)
+        if isinstance(other, int) and other != 0:
+            # Valuation of an integer is known exactly, even if it's beyond target precision. Same
+            # result as dividing by from_int(other) known up to O(p^(N + v(other) - v(self))).
+            w, u = _remove(other, self.p)
+            N = _capped(self.N - w)
+            v = self.v - w
+            if v >= N:
+                return Padic._make(N, N, 0, self.p)
+            m = _p_power(self.p, N - v)
+            return Padic._make(N, v, _mulmod(self.s, _invert(u, m), m), self.p)
         if isinstance(other, int):
             return self / Padic.from_int(other, self.p, self.N + Padic.val(other, self.p) - Padic.val(self))
-        else:
-            raise RuntimeError(f"Can't divide {self} by {other}")
+        if isinstance(other, PadicArray):
+            return NotImplemented
+        raise RuntimeError(f"Can't divide {self} by {other}")
 
     def __rtruediv__(self, other: int) -> Padic:
         return Padic.from_int(other, self.p, self.N + Padic.val(other, self.p) - Padic.val(self)) / self
 
+    # Digits of self below p^v(other). Result is exact (known up to integer precision) only if
+    # all these digits are known.
     def __mod__(self, other: Padic | int) -> Padic:
-        if Padic.val(self) >= Padic.val(other, self.p):
-            return Padic(max(Padic.INTEGER_PRECISION, self.N), max(Padic.INTEGER_PRECISION, self.N), 0, self.p)
-        return Padic.from_int(self.s % self.p ** (min(Padic.val(other, self.p) - Padic.val(self), self.N)),
-                              self.p, max(Padic.INTEGER_PRECISION, self.N), Padic.val(self))
+        k = Padic.val(other, self.p)
+        if Padic.val(self) >= k:
+            N = _capped(max(Padic.INTEGER_PRECISION, self.N))
+            return Padic(N, N, 0, self.p)
+        N = _capped(max(Padic.INTEGER_PRECISION, self.N)) if self.N >= k else self.N
+        return Padic.from_int(self.s % self.p ** (min(k, self.N) - self.v), self.p, N, self.v)
 
     def __rmod__(self, other: int) -> Padic:
         return Padic.from_int(other, self.p, self.v) % self
@@ -124,24 +629,33 @@ class Padic:
         return (other - other % self) / self
 
     def __str__(self) -> str:
-        if self.p > 31:
-            return f"{self.p}-adic + O({self.p}^{self.N})"
-        out = base_repr(self.s, self.p)
+        digits = _digit_string(self.s, self.p)
+        sep = '' if self.p <= 36 else ','
         if self.v >= 0:
+            num = digits + (sep + '0') * self.v if sep else digits + '0' * self.v
             if Padic.DISPLAY_PRECISION is None:
-                return out + ''.join(['0'] * self.v) + f' + O({self.p}^{self.N})'
-            num = out + ''.join(['0'] * self.v)
+                return num + f' + O({self.p}^{self.N})'
             # Space is a workaround space cuz now (08.2023) 3-year-old bug causes pycharm not to
             # print ... if at the start of the string...
-            return ((" ..." if Padic.DISPLAY_PRECISION < len(num) else "") +
-                    num[-Padic.DISPLAY_PRECISION:] + f' + O({self.p}^{self.N})')
+            return Padic._shorten(num, sep) + f' + O({self.p}^{self.N})'
         else:
+            out = digits.split(sep) if sep else digits
+            # Fractional part has exactly -v digits
+            out = ['0'] * (-self.v - len(out)) + out if sep else out.rjust(-self.v, '0')
+            num, frac = sep.join(out[:self.v]), sep.join(out[self.v:])
             if Padic.DISPLAY_PRECISION is None:
-                return out[:self.v] + '.' + out[self.v:] + f' + O({self.p}^{self.N})'
-            num = out[:self.v]
+                return num + '.' + frac + f' + O({self.p}^{self.N})'
             # Same comment as above.
-            return ((" ..." if Padic.DISPLAY_PRECISION < len(num) else "") +
-                    num[-Padic.DISPLAY_PRECISION:] + '.' + out[self.v:] + f' + O({self.p}^{self.N})')
+            return Padic._shorten(num, sep) + '.' + frac + f' + O({self.p}^{self.N})'
+
+    # Last DISPLAY_PRECISION digits of num.
+    @staticmethod
+    def _shorten(num: str, sep: str) -> str:
+        if not sep:
+            return (" ..." if Padic.DISPLAY_PRECISION < len(num) else "") + num[-Padic.DISPLAY_PRECISION:]
+        digits = num.split(sep) if num else []
+        return ((" ..." + sep if Padic.DISPLAY_PRECISION < len(digits) else "") +
+                sep.join(digits[-Padic.DISPLAY_PRECISION:]))
 
     def __repr__(self) -> str:
         return str(self)
@@ -163,16 +677,34 @@ class Padic:
         return str(self)
 
     # Currently works for integer powers only. This may change in the future.
-    # Modulo argument is for now ignored.
-    def __pow__(self, power: int, modulo=None) -> Padic:
+    # Computed by square-and-multiply, negative powers with a single division at the end.
+    # pow(x, n, m) returns x ** n % m.
+    def __pow__(self, power: int, modulo: Padic | int | None = None) -> Padic:
         assert isinstance(power, int)
+        if modulo is not None:
+            return self ** power % modulo
         if power == 0:
-            return Padic.from_int(1, self.p, max(Padic.INTEGER_PRECISION, self.N))
-        if power == 1:
-            return Padic(self.N, self.v, self.s, self.p)
-        if power == -1:
-            return 1 / self
-        return self ** (power // 2) * self ** (power // 2) * self ** (power % 2)
+            return Padic.from_int(1, self.p, _capped(max(Padic.INTEGER_PRECISION, self.N)))
+        if power < 0:
+            return 1 / self ** (-power)
+        # For v >= 0 square-and-multiply below ends with N = (power - 1) * v + N and s^power
+        # reduced modulo p^(N - v), which is a single modular power.
+        if power > 1 and self.v >= 0 and self.s != 0:
+            N = _capped((power - 1) * self.v + self.N)
+            v = power * self.v
+            if v >= N:
+                return Padic._make(N, N, 0, self.p)
+            return Padic._make(N, v, _powmod(self.s, power, _p_power(self.p, N - v)), self.p)
+        out = None
+        base = self
+        while True:
+            if power & 1:
+                out = base if out is None else out * base
+            power >>= 1
+            if not power:
+                break
+            base = base * base
+        return Padic._make(out.N, out.v, out.s, out.p) if out is self else out
 
     def __lshift__(self, other: int) -> Padic:
         assert isinstance(other, int)
@@ -182,8 +714,34 @@ class Padic:
         assert isinstance(other, int)
         return self // self.p ** other
 
+    # Agrees with == for numbers known at least up to O(p^PRECISION). Changing PRECISION changes
+    # hashes, so numbers used as keys of dicts and sets have to be compared with a fixed one.
     def __hash__(self) -> int:
-        return self.s
+        return hash(self.key())
+
+    # Pickles as bytes of to_bytes(), rebuilt by from_bytes.
+    def __reduce__(self) -> tuple[Callable[[bytes], Padic], tuple[bytes]]:
+        return _unpickle_padic, (self.to_bytes(),)
+
+    def to_bytes(self) -> bytes:
+        out = bytearray()
+        _write_varint(out, self.p)
+        _write_record(out, self.N, self.v, self.s)
+        return bytes(out)
+
+    @staticmethod
+    def from_bytes(data) -> Padic:
+        p, pos = _read_varint(data, 0)
+        N, v, s, _ = _read_record(data, pos)
+        return Padic._make(N, v, s, p)
+
+    # Returns the same number known up to O(p^N). If N is bigger than current precision
+    # missing digits are assumed to be zeros.
+    def with_precision(self, N: int) -> Padic:
+        N = _capped(N)
+        if N >= self.N and self.s:
+            return Padic._make(N, self.v, self.s, self.p)
+        return Padic(N, self.v, self.s, self.p)
 
     # Warning! Center isn't necessarily an integer!
     def center(self) -> int | float:
@@ -197,55 +755,85 @@ class Padic:
         if isinstance(n, int) and p is not None:
             if n == 0:
                 return Padic.INTEGER_PRECISION
-            out = 0
-            while n % p == 0:
-                out += 1
-                n //= p
-            return out
+            if p == 2:
+                return (n & -n).bit_length() - 1
+            return _remove(n, p)[0]
         raise RuntimeError("Valuation undefined for " + str(n), type(n))
 
+    # Valuations of many integers at once. Powers p^(2^k) are built once, up to the longest of ns,
+    # and every step of the search of _remove divides all values still divisible by p^(2^k) together.
+    @staticmethod
+    def vals(ns: list[int], p: int) -> list[int]:
+        if p == 2:
+            return [(n & -n).bit_length() - 1 if n else Padic.INTEGER_PRECISION for n in ns]
+        rest = list(ns)
+        out = [0 if n else Padic.INTEGER_PRECISION for n in ns]
+        powers = [p]
+        bits = max((abs(n).bit_length() for n in ns), default=0)
+        while powers[-1].bit_length() <= bits:
+            powers.append(powers[-1] * powers[-1])
+        # Up: v >= 2^(k+1) - 1 for values divisible by p, p^2, ..., p^(2^k), top is the first failure
+        top = [0] * len(ns)
+        active = [i for i, n in enumerate(ns) if n and n % p == 0]
+        k = 0
+        while active:
+            still = []
+            for i in active:
+                q, r = divmod(rest[i], powers[k])
+                if r:
+                    top[i] = k
+                else:
+                    rest[i] = q
+                    out[i] += 1 << k
+                    still.append(i)
+            active = still
+            k += 1
+        # Down: binary digits of the rest of v from the highest one
+        for k in range(k - 2, -1, -1):
+            for i in [i for i in range(len(ns)) if top[i] > k]:
+                q, r = divmod(rest[i], powers[k])
+                if not r:
+                    rest[i] = q
+                    out[i] += 1 << k
+        return out
+
     @staticmethod
     def _digit_value(c: str) -> int:
-        o = ord(c)
-        if ord('0') <= o <= ord('9'):
-            return o - ord('0')
-        if ord('A') <= o <= ord('Z'):
-            return o - ord('A') + 10
+        if c in _DIGIT_VALUES:
+            return _DIGIT_VALUES[c]
         raise RuntimeError("Couldn't assign digit value for: " + c)
 
+    # Digits are characters 0-9, A-Z or, for p > 36, decimal numbers separated by commas
+    # (as printed by __str__). Precision is one more than number of digits before the point.
     @staticmethod
     def from_string(string: str, p: int | None = None) -> Padic:
         if p is None:
             p = Padic.DEFAULT_PRIME
-        v = 0
-        N = len(string) + 1
-        non_zero_occurred = False
-        dot_occurred = False
-        stop = 0
-        for i in range(len(string) - 1, -1, -1):
-            char = string[i]
-            if char == '.' and not dot_occurred:
-                v -= len(string) - 1 - i
-                N = i + 1
-                dot_occurred = True
-                continue
-            if not char.isalnum():
+        if p > 36 or ',' in string:
+            whole, dot, frac = string.partition('.')
+            tokens = [whole.split(','), frac.split(',') if dot else []]
+            try:
+                whole, frac = [[int(t) if t.strip().isdigit() else -1 for t in part if t.strip()] for part in tokens]
+            except ValueError:
                 raise RuntimeError("Cannot parse string: " + string + " to p-adic integer.")
-            if not non_zero_occurred and char != '0':
-                non_zero_occurred = True
-                stop = i
-                v += len(string) - 2 - i if dot_occurred else len(string) - 1 - i
-            if Padic._digit_value(char) >= p:
+        else:
+            whole, dot, frac = string.partition('.')
+            raw = whole + frac
+            try:
+                whole, frac = [[_DIGIT_VALUES[c] for c in part] for part in (whole, frac)]
+            except KeyError:
                 raise RuntimeError("Cannot parse string: " + string + " to p-adic integer.")
-        s = 0
-        for char in string[:stop + 1]:
-            if char == '.':
-                continue
-            s *= p
-            s += Padic._digit_value(char)
-        if s == 0:
+        digits = whole + frac
+        if any(d < 0 or d >= p for d in digits):
+            raise RuntimeError("Cannot parse string: " + string + " to p-adic integer.")
+        N = len(whole) + 1
+        end = len(digits)
+        while end and digits[end - 1] == 0:
+            end -= 1
+        if end == 0:
             return Padic(N, N, 0, p)
-        return Padic(N, v, s, p)
+        s = int(raw[:end], 2) if p == 2 and ',' not in string else _from_digits(digits, p, 0, end)
+        return Padic(N, len(digits) - end - len(frac), s, p)
 
     @staticmethod
     # Calculates p^{v_adj}a + O(p^N) with a not necessarily coprime with p nor equal to 0
@@ -257,8 +845,8 @@ class Padic:
             N = Padic.INTEGER_PRECISION
         if a == 0:
             return Padic(N, N, a, p)
-        v = Padic.val(a, p)
-        return Padic(N, v + v_adj, a // (p ** v), p)
+        v, a = _remove(a, p)
+        return Padic(N, v + v_adj, a, p)
 
     @staticmethod
     # Creates p-adic number as fraction a/b. Doesn't check for corectness of given arguments
@@ -269,37 +857,1017 @@ class Padic:
             N = Padic.INTEGER_PRECISION
         return Padic.from_int(a, p, N) / Padic.from_int(b, p, N)
 
+    # Rational number a/b with |a|, |b| <= bound (by default sqrt(p^(N - v) / 2), then it's
+    # unique if exists) equal to self. Found by extended Euclid's algorithm on p^(N - v) and s.
+    def to_rational(self, bound: int | None = None) -> Rational:
+        if self.s == 0:
+            return Rational(0)
+        m = _p_power(self.p, self.N - self.v)
+        if bound is None:
+            bound = isqrt(m // 2)
+        r0, r1 = m, self.s
+        t0, t1 = 0, 1
+        while r1 > bound:
+            q = r0 // r1
+            r0, r1 = r1, r0 - q * r1
+            t0, t1 = t1, t0 - q * t1
+        if r1 == 0 or abs(t1) > bound or _math_gcd(t1, self.p) != 1:
+            raise RuntimeError(f"{self} isn't a fraction with numerator and denominator bounded by {bound}")
+        if self.v >= 0:
+            return Rational(r1 * _p_power(self.p, self.v), t1)
+        return Rational(r1, t1 * _p_power(self.p, -self.v))
+
+
+# Batch of p-adic numbers sharing the same prime. Stores N, v and s of each number as separate
+# columns (plain lists of ints) so that elementwise operations don't have to create a Padic
+# object per element. Semantics of every operation are exactly the same as for Padic.
+class PadicArray:
+    def __init__(self, N: list[int], v: list[int], s: list[int], p: int | None = None) -> None:
+        if p is None:
+            p = Padic.DEFAULT_PRIME
+        if not len(N) == len(v) == len(s):
+            raise RuntimeError("Columns of PadicArray have to be of equal length")
+        self.p: int = p
+        self.N: list[int] = [_capped(n) for n in N]
+        self.v: list[int] = []
+        self.s: list[int] = []
+        for n, e, a in zip(self.N, v, s):
+            if e >= n:
+                a = 0
+            if a == 0:
+                e = n
+            self.v.append(e)
+            self.s.append(a % _p_power(p, n - e))
+
+    # Builds array from already normalized columns (e.g. taken from Padic objects).
+    @staticmethod
+    def _from_columns(N: list[int], v: list[int], s: list[int], p: int) -> PadicArray:
+        out = PadicArray.__new__(PadicArray)
+        out.N, out.v, out.s, out.p = N, v, s, p
+        return out
+
+    @staticmethod
+    def from_padics(values: list[Padic], p: int | None = None) -> PadicArray:
+        values = list(values)
+        if p is None:
+            p = values[0].p if values else Padic.DEFAULT_PRIME
+        if any(x.p != p for x in values):
+            raise RuntimeError(f"All elements of PadicArray have to be {p}-adic numbers")
+        return PadicArray._from_columns([x.N for x in values], [x.v for x in values], [x.s for x in values], p)
+
+    @staticmethod
+    def from_ints(values: list[int], p: int | None = None, N: int | None = None) -> PadicArray:
+        if p is None:
+            p = Padic.DEFAULT_PRIME
+        if N is None:
+            N = Padic.INTEGER_PRECISION
+        return PadicArray.from_padics([Padic.from_int(a, p, N) for a in values], p)
+
+    # Same format as write_padics.
+    def to_bytes(self) -> bytes:
+        out = bytearray(_STREAM_MAGIC)
+        _write_varint(out, self.p)
+        for n, e, a in zip(self.N, self.v, self.s):
+            _write_record(out, n, e, a)
+        return bytes(out)
+
+    @staticmethod
+    def from_bytes(data) -> PadicArray:
+        p, pos = _read_stream_header(data)
+        N, v, s = [], [], []
+        end = len(data)
+        while pos < end:
+            n, e, a, pos = _read_record(data, pos)
+            N.append(n)
+            v.append(e)
+            s.append(a)
+        return PadicArray._from_columns(N, v, s, p)
+
+    # Fractions a/b for a in nums, b in dens, same as Padic.from_frac elementwise. Units of all
+    # denominators are inverted at once modulo the biggest needed power of p (Montgomery's trick).
+    @staticmethod
+    def from_fracs(nums: list[int], dens: list[int], p: int | None = None, N: int | None = None) -> PadicArray:
+        if p is None:
+            p = Padic.DEFAULT_PRIME
+        if N is None:
+            N = Padic.INTEGER_PRECISION
+        if len(nums) != len(dens):
+            raise RuntimeError(f"Lengths of numerators and denominators don't match: {len(nums)} and {len(dens)}")
+        # Valuations and units of numerators and denominators, and precision of every quotient
+        vn, un, vd, ud, precision = [], [], [], [], []
+        for a, b in zip(nums, dens):
+            e2, ub = _remove(b, p) if b else (N, 0)
+            if e2 >= N:
+                raise RuntimeError(f"Can't divide {a} by {b} + O({p}^{N})")
+            e1, ua = _remove(a, p) if a else (N, 0)
+            e1 = min(e1, N)
+            vn.append(e1)
+            un.append(ua)
+            vd.append(e2)
+            ud.append(ub)
+            precision.append(_capped(min(e1 - 2 * e2, -e2) + N))
+        m = _p_power(p, max([0] + [n - e1 + e2 for n, e1, e2 in zip(precision, vn, vd)]))
+        # Inverse of a short denominator takes only a few steps of Euclid's algorithm. Long ones
+        # are inverted together with Montgomery's trick: a single inverse of their product.
+        short = m.bit_length() // 8
+        inverses = [_invert(b, m) if b.bit_length() <= short else None for b in ud]
+        batch = [i for i, t in enumerate(inverses) if t is None]
+        prefix = [1] * (len(batch) + 1)
+        for j, i in enumerate(batch):
+            prefix[j + 1] = _mulmod(prefix[j], ud[i], m)
+        t = _invert(prefix[-1], m)
+        for j in range(len(batch) - 1, -1, -1):
+            inverses[batch[j]] = _mulmod(t, prefix[j], m)
+            t = _mulmod(t, ud[batch[j]], m)
+        Ns, vs, ss = precision, [0] * len(ud), [0] * len(ud)
+        for i, t in enumerate(inverses):
+            n, e = precision[i], vn[i] - vd[i]
+            if e >= n or un[i] == 0:
+                vs[i] = n
+            else:
+                vs[i], ss[i] = e, _mulmod(un[i], t, _p_power(p, n - e))
+        return PadicArray._from_columns(Ns, vs, ss, p)
+
+    def to_padics(self) -> list[Padic]:
+        return [Padic._make(n, e, a, self.p) for n, e, a in zip(self.N, self.v, self.s)]
+
+    def __len__(self) -> int:
+        return len(self.s)
+
+    def __iter__(self):
+        return iter(self.to_padics())
+
+    def __getitem__(self, item: int | slice) -> Padic | PadicArray:
+        if isinstance(item, slice):
+            return PadicArray._from_columns(self.N[item], self.v[item], self.s[item], self.p)
+        return Padic._make(self.N[item], self.v[item], self.s[item], self.p)
+
+    def __str__(self) -> str:
+        return '[' + ', '.join(str(x) for x in self) + ']'
+
+    def __repr__(self) -> str:
+        return str(self)
+
+    # Returns columns (N, v, s) of other broadcast to the length of self.
+    # Integers are converted with precision depending on the respective element of self,
+    # same as in Padic arithmetic. int_precision(n, v, a) returns that precision.
+    def _columns(self, other: PadicArray | Padic | int,
+                 int_precision: Callable[[int, int, int], int]) -> tuple[list[int], list[int], list[int]]:
+        if isinstance(other, PadicArray) and other.p == self.p:
+            if len(other) != len(self):
+                raise RuntimeError(f"Lengths of PadicArrays don't match: {len(self)} and {len(other)}")
+            return other.N, other.v, other.s
+        length = len(self)
+        if isinstance(other, Padic) and other.p == self.p:
+            return [other.N] * length, [other.v] * length, [other.s] * length
+        if isinstance(other, int):
+            values = [Padic.from_int(other, self.p, int_precision(n, e, other)) for n, e in zip(self.N, self.v)]
+            return [x.N for x in values], [x.v for x in values], [x.s for x in values]
+        raise RuntimeError(f"Can't broadcast {other} to {self.p}-adic array")
+
+    def __add__(self, other: PadicArray | Padic | int) -> PadicArray:
+        p = self.p
+        N2, v2, s2 = self._columns(other, lambda n, e, a: n)
+        N, v, s = [], [], []
+        for n1, e1, a1, n2, e2, a2 in zip(self.N, self.v, self.s, N2, v2, s2):
+            n = n1 if n1 < n2 else n2
+            d = e1 - e2
+            if d > 0:
+                e, a = e2, _p_power(p, d) * a1 + a2
+            elif d < 0:
+                e, a = e1, a1 + _p_power(p, -d) * a2
+            else:
+                a = a1 + a2
+                if a == 0:
+                    e = n
+                else:
+                    w, a = _remove(a, p)
+                    e = e1 + w
+            if e >= n:
+                e, a = n, 0
+            N.append(n)
+            v.append(e)
+            s.append(a % _p_power(p, n - e))
+        return PadicArray._from_columns(N, v, s, p)
+
+    def __radd__(self, other: Padic | int) -> PadicArray:
+        return self + other
+
+    def __neg__(self) -> PadicArray:
+        p = self.p
+        return PadicArray._from_columns(list(self.N), list(self.v),
+                                        [-a % _p_power(p, n - e) for n, e, a in zip(self.N, self.v, self.s)], p)
+
+    def __sub__(self, other: PadicArray | Padic | int) -> PadicArray:
+        return self + (-other)
+
+    def __rsub__(self, other: Padic | int) -> PadicArray:
+        return -(self - other)
+
+    def __mul__(self, other: PadicArray | Padic | int) -> PadicArray:
+        p = self.p
+        N2, v2, s2 = self._columns(other, lambda n, e, a: n + Padic.val(a, p) - e)
+        cap = None if Padic.TARGET_PRECISION is None else Padic.TARGET_PRECISION + Padic.GUARD_DIGITS
+        N, v, s = [], [], []
+        for n1, e1, a1, n2, e2, a2 in zip(self.N, self.v, self.s, N2, v2, s2):
+            n = e1 + n2 if e1 + n2 < e2 + n1 else e2 + n1
+            if cap is not None and n > cap:
+                n = cap
+            e = e1 + e2
+            if e >= n or a1 == 0 or a2 == 0:
+                e, a = n, 0
+            else:
+                a = _mulmod(a1, a2, _p_power(p, n - e))
+            N.append(n)
+            v.append(e)
+            s.append(a)
+        return PadicArray._from_columns(N, v, s, p)
+
+    def __rmul__(self, other: Padic | int) -> PadicArray:
+        return self * other
+
+    def __truediv__(self, other: PadicArray | Padic | int) -> PadicArray:
+        p = self.p
+        if isinstance(other, int) and other != 0:
+            # Same as Padic.__truediv__, valuation of an integer is known exactly
+            w, u = _remove(other, p)
+            N, v, s = [], [], []
+            for n, e, a in zip(self.N, self.v, self.s):
+                n, e = _capped(n - w), e - w
+                if e >= n:
+                    e, a = n, 0
+                else:
+                    m = _p_power(p, n - e)
+                    a = _mulmod(a, _invert(u, m), m)
+                N.append(n)
+                v.append(e)
+                s.append(a)
+            return PadicArray._from_columns(N, v, s, p)
+        N2, v2, s2 = self._columns(other, lambda n, e, a: n + Padic.val(a, p) - e)
+        return PadicArray._divide(self.N, self.v, self.s, N2, v2, s2, p)
+
+    def __rtruediv__(self, other: Padic | int) -> PadicArray:
+        p = self.p
+        N1, v1, s1 = self._columns(other, lambda n, e, a: n + Padic.val(a, p) - e)
+        return PadicArray._divide(N1, v1, s1, self.N, self.v, self.s, p)
+
+    @staticmethod
+    def _divide(N1: list[int], v1: list[int], s1: list[int],
+                N2: list[int], v2: list[int], s2: list[int], p: int) -> PadicArray:
+        N, v, s = [], [], []
+        cap = _cap()
+        for n1, e1, a1, n2, e2, a2 in zip(N1, v1, s1, N2, v2, s2):
+            if a2 == 0 and cap is not None and n2 >= cap:
+                raise RuntimeError(f"Can't divide by 0 + O({p}^{n2}) under target precision, increase guard digits")
+            n = _capped(min(e1 + n2 - 2 * e2, n1 - e2))
+            e = e1 - e2
+            if e >= n:
+                e, a = n, 0
+            else:
+                m = _p_power(p, n - e)
+                a = _mulmod(a1, _invert(a2, m), m)
+                if a == 0:
+                    e = n
+            N.append(n)
+            v.append(e)
+            s.append(a)
+        return PadicArray._from_columns(N, v, s, p)
+
+    # Elementwise comparison, same as Padic.__eq__.
+    def __eq__(self, other: PadicArray | Padic | int) -> list[bool]:
+        p = self.p
+        N2, v2, s2 = self._columns(other, lambda n, e, a: n)
+        cap = _capped(Padic.PRECISION)
+        out = []
+        for n1, e1, a1, n2, e2, a2 in zip(self.N, self.v, self.s, N2, v2, s2):
+            k = min(cap, n1, n2)
+            if e1 >= k or e2 >= k:
+                out.append(e1 >= k and e2 >= k)
+            else:
+                out.append(e1 == e2 and (a1 - a2) % _p_power(p, k - e1) == 0)
+        return out
+
+    def __ne__(self, other: PadicArray | Padic | int) -> list[bool]:
+        return [not b for b in self == other]
+
+    # Valuations of all elements.
+    def val(self) -> list[int]:
+        return list(self.v)
+
+    def sum(self) -> Padic:
+        if not len(self):
+            return Padic.from_int(0, self.p)
+        return self._reduce(PadicArray.__add__)
+
+    def prod(self) -> Padic:
+        if not len(self):
+            return Padic.from_int(1, self.p)
+        return self._reduce(PadicArray.__mul__)
+
+    # Folds array pairwise with elementwise op, halving its length each step.
+    def _reduce(self, op: Callable[[PadicArray, PadicArray], PadicArray]) -> Padic:
+        arr = self
+        while len(arr) > 1:
+            half = len(arr) // 2
+            out = op(arr[:half], arr[half:2 * half])
+            if len(arr) % 2:
+                out = PadicArray._from_columns(out.N + arr.N[-1:], out.v + arr.v[-1:], out.s + arr.s[-1:], arr.p)
+            arr = out
+        return arr[0]
+
+
+# Deduplicating pool of p-adic numbers. Numbers with equal key(digits) are stored once: index
+# gives the position of the stored one (a stable id, assigned in order of first appearance) and
+# intern the stored number itself, so equal numbers from large collections share one object.
+class PadicPool:
+    def __init__(self, values: list[Padic] | None = None, digits: int | None = None) -> None:
+        self.digits: int = Padic.PRECISION if digits is None else digits
+        self.values: list[Padic] = []
+        self._ids: dict[tuple[int, ...], int] = {}
+        for x in values or []:
+            self.index(x)
+
+    def index(self, x: Padic) -> int:
+        key = x.key(self.digits)
+        i = self._ids.get(key)
+        if i is None:
+            i = self._ids[key] = len(self.values)
+            self.values.append(x)
+        return i
+
+    def intern(self, x: Padic) -> Padic:
+        return self.values[self.index(x)]
+
+    # Position of x in the pool or None, doesn't add it.
+    def find(self, x: Padic) -> int | None:
+        return self._ids.get(x.key(self.digits))
+
+    def __contains__(self, x: Padic) -> bool:
+        return x.key(self.digits) in self._ids
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def __getitem__(self, i: int) -> Padic:
+        return self.values[i]
+
+
+# Arithmetic of p-adic numbers for fixed p and precision cap N, for loops doing many operations
+# with the same parameters. Powers of p up to p^N are computed once, results are built without
+# normalization and inverses of many numbers cost a single modular inversion (Montgomery's trick).
+# Results are the same as of Padic operations, but known at most up to O(p^N).
+class PadicContext:
+    def __init__(self, p: int | None = None, N: int | None = None) -> None:
+        if p is None:
+            p = Padic.DEFAULT_PRIME
+        if N is None:
+            N = Padic.PRECISION
+        self.p: int = p
+        self.N: int = N
+        self.moduli: list[int] = [1] * (N + 1)
+        for k in range(1, N + 1):
+            self.moduli[k] = self.moduli[k - 1] * p
+
+    def _modulus(self, k: int) -> int:
+        return self.moduli[k] if k <= self.N else _p_power(self.p, k)
+
+    # Number p^v * s + O(p^N) normalized as in Padic.__init__.
+    def _padic(self, N: int, v: int, s: int) -> Padic:
+        if v >= N or s == 0:
+            return Padic._make(N, N, 0, self.p)
+        return Padic._make(N, v, s % self._modulus(N - v), self.p)
+
+    def _check(self, x: Padic | int) -> Padic:
+        if isinstance(x, int):
+            return self.from_int(x)
+        if x.p != self.p:
+            raise RuntimeError(f"{x} is not a {self.p}-adic number")
+        return x
+
+    def from_int(self, a: int) -> Padic:
+        if a == 0:
+            return Padic._make(self.N, self.N, 0, self.p)
+        v, a = _remove(a, self.p)
+        return self._padic(self.N, v, a)
+
+    def from_frac(self, a: int, b: int) -> Padic:
+        return self.div(self.from_int(a), self.from_int(b))
+
+    def add(self, x: Padic | int, y: Padic | int) -> Padic:
+        x, y = self._check(x), self._check(y)
+        N = min(self.N, x.N, y.N)
+        d = x.v - y.v
+        if d > 0:
+            return self._padic(N, y.v, self._modulus(d) * x.s + y.s)
+        if d < 0:
+            return self._padic(N, x.v, x.s + self._modulus(-d) * y.s)
+        s = x.s + y.s
+        if s == 0:
+            return Padic._make(N, N, 0, self.p)
+        w, s = _remove(s, self.p)
+        return self._padic(N, x.v + w, s)
+
+    def neg(self, x: Padic | int) -> Padic:
+        x = self._check(x)
+        return self._padic(min(self.N, x.N), x.v, -x.s)
+
+    def sub(self, x: Padic | int, y: Padic | int) -> Padic:
+        return self.add(x, self.neg(y))
+
+    def mul(self, x: Padic | int, y: Padic | int) -> Padic:
+        x, y = self._check(x), self._check(y)
+        N = min(self.N, x.v + y.N, y.v + x.N)
+        v = x.v + y.v
+        if v >= N or x.s == 0 or y.s == 0:
+            return Padic._make(N, N, 0, self.p)
+        return Padic._make(N, v, _mulmod(x.s, y.s, self._modulus(N - v)), self.p)
+
+    def inv(self, x: Padic | int) -> Padic:
+        return self.batch_inv([x])[0]
+
+    def div(self, x: Padic | int, y: Padic | int) -> Padic:
+        x, y = self._check(x), self._check(y)
+        if y.s == 0:
+            raise RuntimeError("Can't divide by zero")
+        N = min(self.N, x.v + y.N - 2 * y.v, x.N - y.v)
+        v = x.v - y.v
+        if v >= N or x.s == 0:
+            return Padic._make(N, N, 0, self.p)
+        m = self._modulus(N - v)
+        return Padic._make(N, v, _mulmod(x.s, _invert(y.s, m), m), self.p)
+
+    # Inverses of all given numbers. Units s of all of them are inverted modulo the biggest needed
+    # power of p with prefix products, one modular inverse and a backward sweep.
+    def batch_inv(self, values: list[Padic | int]) -> list[Padic]:
+        values = [self._check(x) for x in values]
+        if any(x.s == 0 for x in values):
+            raise RuntimeError("Can't invert zero")
+        if not values:
+            return []
+        precision = [min(self.N, x.N - 2 * x.v) for x in values]
+        m = self._modulus(max(n + x.v for n, x in zip(precision, values)))
+        prefix = [1] * (len(values) + 1)
+        for i, x in enumerate(values):
+            prefix[i + 1] = _mulmod(prefix[i], x.s, m)
+        t = _invert(prefix[-1], m)
+        out = [None] * len(values)
+        for i in range(len(values) - 1, -1, -1):
+            x = values[i]
+            out[i] = self._padic(precision[i], -x.v, t * prefix[i])
+            t = _mulmod(t, x.s, m)
+        return out
+
+    def sum(self, values: list[Padic | int]) -> Padic:
+        out = self.from_int(0)
+        for x in values:
+            out = self.add(out, x)
+        return out
+
+    def prod(self, values: list[Padic | int]) -> Padic:
+        out = self.from_int(1)
+        for x in values:
+            out = self.mul(out, x)
+        return out
+
+
+# Row of numbers as a single int with one slot of given size (in bytes) per number, lowest first.
+def _pack(values: list[int], size: int) -> int:
+    return int.from_bytes(b''.join([x.to_bytes(size, 'little') for x in values]), 'little')
+
+
+def _unpack(packed: int, count: int, size: int) -> list[int]:
+    data = packed.to_bytes(count * size, 'little')
+    return [int.from_bytes(data[j:j + size], 'little') for j in range(0, count * size, size)]
+
+
+# Gaussian elimination of matrix a (list of rows of ints, modified in place) modulo p^k with full
+# pivoting by valuation. Pivot of every step is an entry of the smallest valuation w in the rest of
+# the matrix, so it divides all of them and multipliers are p-adic integers: no digits are lost.
+# Pivot valuations never decrease and are valuations of the invariant factors (Smith normal form).
+# Afterwards a holds multipliers below the diagonal (L with implied unit diagonal) and U on and
+# above it, L * U == a permuted by rows and cols (mod p^k). Returns rows, cols and the pivot
+# valuations, one per step until the rest of the matrix is 0 modulo p^k.
+# Rows not eliminated yet are packed (see _pack), so a row operation is a single multiplication
+# by a number below p^k and an addition of the pivot row negated modulo p^k, followed by a shift
+# dropping the eliminated column. Rows are reduced only when they become pivot rows: in between
+# every step adds less than p^2k to each slot, so slots have room for n such additions.
+def _eliminate(a: list[list[int]], p: int, k: int) -> tuple[list[int], list[int], list[int]]:
+    n, ncols = len(a), len(a[0]) if a else 0
+    m = _p_power(p, k)
+    rows, cols, ws = list(range(n)), list(range(ncols)), []
+    size = (2 * m.bit_length() + n.bit_length() + 8) // 8
+    bits, mask = 8 * size, (1 << 8 * size) - 1
+    packed = [_pack([x % m for x in row], size) for row in a]
+    w = 0
+    for i in range(min(n, ncols)):
+        # Pivot of valuation w, w + 1, ..., the diagonal entry if possible
+        pivot = None
+        while w < k:
+            q = _p_power(p, w + 1)
+            if (packed[i] & mask) % q:
+                pivot = i, i
+                break
+            pivot = next(((r, i + c) for r in range(i, n)
+                          for c, x in enumerate(_unpack(packed[r], ncols - i, size)) if x % q), None)
+            if pivot is not None:
+                break
+            w += 1
+        if pivot is None:
+            break
+        r, c = pivot
+        if r != i:
+            a[i], a[r] = a[r], a[i]
+            packed[i], packed[r] = packed[r], packed[i]
+            rows[i], rows[r] = rows[r], rows[i]
+        if c != i:
+            d = (c - i) * bits
+            for j in range(i, n):
+                x, y = packed[j] & mask, (packed[j] >> d) & mask
+                packed[j] += y - x + ((x - y) << d)
+            for row in a[:i]:
+                row[i], row[c] = row[c], row[i]
+            cols[i], cols[c] = cols[c], cols[i]
+        ws.append(w)
+        u = [x % m for x in _unpack(packed[i], ncols - i, size)]
+        a[i][i:] = u
+        pw, mw = _p_power(p, w), _p_power(p, k - w)
+        t = _invert(u[0] // pw, mw)
+        negated = _pack([m - y for y in u[1:]], size) << bits
+        for r in range(i + 1, n):
+            x = packed[r] & mask
+            if x % m:
+                f = _mulmod(x // pw, t, mw)
+                a[r][i] = f
+                packed[r] = (packed[r] + f * negated) >> bits
+            else:
+                a[r][i] = 0
+                packed[r] >>= bits
+    r = len(ws)
+    for row, x in zip(a[r:], packed[r:]):
+        row[r:] = [y % m for y in _unpack(x, ncols - r, size)]
+    return rows, cols, ws
+
+
+# Parity of permutation given as a list: 1 if even, -1 if odd.
+def _parity(perm: list[int]) -> int:
+    sign, seen = 1, [False] * len(perm)
+    for i in range(len(perm)):
+        j = i
+        while not seen[j]:
+            seen[j] = True
+            j = perm[j]
+            if not seen[j]:
+                sign = -sign
+    return sign
+
+
+# Matrix of p-adic numbers known up to a common O(p^N). Entry (i, j) is p^v * s[i * cols + j] + O(p^N),
+# where s is a single row-major list of ints reduced modulo p^(N - v) and v is a lower bound of
+# valuations of entries. Converting numbers known up to different precisions keeps the lowest one.
+# Linear algebra pivots by valuation (see _eliminate) and precision of results follows from the
+# pivot valuations, the same way as for Padic division.
+class PadicMatrix:
+    def __init__(self, rows: int, cols: int, N: int, v: int, s: list[int], p: int | None = None) -> None:
+        if p is None:
+            p = Padic.DEFAULT_PRIME
+        if len(s) != rows * cols:
+            raise RuntimeError(f"{rows}x{cols} matrix can't have {len(s)} entries")
+        N = _capped(N)
+        m = _p_power(p, N - v) if v < N else 1
+        s = [a % m for a in s]
+        self.rows: int = rows
+        self.cols: int = cols
+        self.N: int = N
+        self.v: int = v if any(s) else N
+        self.s: list[int] = s
+        self.p: int = p
+
+    # Fast path constructor for internal use, s has to be already reduced modulo p^(N - v).
+    @staticmethod
+    def _make(rows: int, cols: int, N: int, v: int, s: list[int], p: int) -> PadicMatrix:
+        out = PadicMatrix.__new__(PadicMatrix)
+        out.rows, out.cols, out.N, out.v, out.s, out.p = rows, cols, N, v, s, p
+        return out
+
+    # Matrix from list of rows of Padic numbers and ints. Ints are converted up to O(p^N).
+    @staticmethod
+    def from_rows(rows: list[list[Padic | int]], p: int | None = None, N: int | None = None) -> PadicMatrix:
+        rows = [list(row) for row in rows]
+        if p is None:
+            p = next((x.p for row in rows for x in row if isinstance(x, Padic)), Padic.DEFAULT_PRIME)
+        if N is None:
+            N = Padic.INTEGER_PRECISION
+        cols = len(rows[0]) if rows else 0
+        if any(len(row) != cols for row in rows):
+            raise RuntimeError("All rows of PadicMatrix have to be of equal length")
+        values = [x if isinstance(x, Padic) else Padic.from_int(x, p, N) for row in rows for x in row]
+        if any(x.p != p for x in values):
+            raise RuntimeError(f"All elements of PadicMatrix have to be {p}-adic numbers")
+        N = min((x.N for x in values), default=N)
+        v = min((x.v for x in values), default=N)
+        return PadicMatrix(len(rows), cols, N, v, [_p_power(p, x.v - v) * x.s for x in values], p)
+
+    # n x n identity matrix known up to O(p^N).
+    @staticmethod
+    def identity(n: int, p: int | None = None, N: int | None = None) -> PadicMatrix:
+        if N is None:
+            N = Padic.INTEGER_PRECISION
+        return PadicMatrix(n, n, N, 0, [int(i == j) for i in range(n) for j in range(n)], p)
+
+    def _entry(self, a: int) -> Padic:
+        if a == 0:
+            return Padic._make(self.N, self.N, 0, self.p)
+        w, a = _remove(a, self.p)
+        return Padic._make(self.N, self.v + w, a, self.p)
+
+    def __getitem__(self, item: tuple[int, int]) -> Padic:
+        i, j = item
+        if not (0 <= i < self.rows and 0 <= j < self.cols):
+            raise IndexError(f"Index {item} out of range of {self.rows}x{self.cols} matrix")
+        return self._entry(self.s[i * self.cols + j])
+
+    def to_rows(self) -> list[list[Padic]]:
+        c = self.cols
+        return [[self._entry(a) for a in self.s[i * c:(i + 1) * c]] for i in range(self.rows)]
+
+    def __str__(self) -> str:
+        return '[' + ', '.join('[' + ', '.join(str(x) for x in row) + ']' for row in self.to_rows()) + ']'
+
+    def __repr__(self) -> str:
+        return str(self)
+
+    def _check(self, other: PadicMatrix) -> None:
+        if not isinstance(other, PadicMatrix) or other.p != self.p:
+            raise RuntimeError(f"{other} is not a {self.p}-adic matrix")
+
+    # Significands of self and other scaled to the common v, modulo p^(N - v).
+    def _aligned(self, other: PadicMatrix) -> tuple[int, int, list[int], list[int]]:
+        self._check(other)
+        if (self.rows, self.cols) != (other.rows, other.cols):
+            raise RuntimeError(f"Shapes of matrices don't match: {self.rows}x{self.cols} and {other.rows}x{other.cols}")
+        N, v = min(self.N, other.N), min(self.v, other.v)
+        s1, s2 = self.s, other.s
+        if self.v > v:
+            t = _p_power(self.p, self.v - v)
+            s1 = [t * a for a in s1]
+        if other.v > v:
+            t = _p_power(self.p, other.v - v)
+            s2 = [t * a for a in s2]
+        return N, v, s1, s2
+
+    # Equal if all entries are equal as Padic numbers, i.e. agree modulo p^k for
+    # k = min(PRECISION, N of both).
+    def __eq__(self, other: PadicMatrix) -> bool:
+        if not isinstance(other, PadicMatrix):
+            return NotImplemented
+        if self.p != other.p or (self.rows, self.cols) != (other.rows, other.cols):
+            return False
+        k = _capped(min(Padic.PRECISION, self.N, other.N))
+        _, v, s1, s2 = self._aligned(other)
+        if v >= k:
+            return True
+        m = _p_power(self.p, k - v)
+        return all((a - b) % m == 0 for a, b in zip(s1, s2))
+
+    def __add__(self, other: PadicMatrix) -> PadicMatrix:
+        N, v, s1, s2 = self._aligned(other)
+        return PadicMatrix(self.rows, self.cols, N, v, [a + b for a, b in zip(s1, s2)], self.p)
+
+    def __neg__(self) -> PadicMatrix:
+        return PadicMatrix(self.rows, self.cols, self.N, self.v, [-a for a in self.s], self.p)
+
+    def __sub__(self, other: PadicMatrix) -> PadicMatrix:
+        N, v, s1, s2 = self._aligned(other)
+        return PadicMatrix(self.rows, self.cols, N, v, [a - b for a, b in zip(s1, s2)], self.p)
+
+    # Product with a number, ints are converted up to O(p^N) of the matrix.
+    def __mul__(self, other: Padic | int) -> PadicMatrix:
+        if isinstance(other, int):
+            other = Padic.from_int(other, self.p, self.N)
+        if not isinstance(other, Padic) or other.p != self.p:
+            return NotImplemented
+        N = min(self.v + other.N, other.v + self.N)
+        v = self.v + other.v
+        return PadicMatrix(self.rows, self.cols, N, v, [a * other.s for a in self.s], self.p)
+
+    def __rmul__(self, other: Padic | int) -> PadicMatrix:
+        return self * other
+
+    # Matrix product. Every entry is a single sum of products of significands reduced once.
+    def __matmul__(self, other: PadicMatrix) -> PadicMatrix:
+        self._check(other)
+        if self.cols != other.rows:
+            raise RuntimeError(f"Can't multiply {self.rows}x{self.cols} and {other.rows}x{other.cols} matrices")
+        N = _capped(min(self.v + other.N, other.v + self.N))
+        v = self.v + other.v
+        if v >= N:
+            return PadicMatrix._make(self.rows, other.cols, N, N, [0] * (self.rows * other.cols), self.p)
+        m = _p_power(self.p, N - v)
+        n, c = self.cols, other.cols
+        columns = [other.s[j::c] for j in range(c)]
+        s = []
+        for i in range(self.rows):
+            row = self.s[i * n:(i + 1) * n]
+            s.extend([sum(map(_int_mul, row, col)) % m for col in columns])
+        return PadicMatrix(self.rows, c, N, v, s, self.p)
+
+    def transpose(self) -> PadicMatrix:
+        r, c = self.rows, self.cols
+        return PadicMatrix._make(c, r, self.N, self.v, [self.s[i * c + j] for j in range(c) for i in range(r)], self.p)
+
+    # Rows of significands reduced modulo p^(N - v), for elimination.
+    def _significand_rows(self) -> list[list[int]]:
+        c = self.cols
+        return [self.s[i * c:(i + 1) * c] for i in range(self.rows)]
+
+    # Number of invariant factors of valuation below N, i.e. rank of any matrix in the interval.
+    def rank(self) -> int:
+        return len(_eliminate(self._significand_rows(), self.p, self.N - self.v)[2])
+
+    # Diagonal matrix of the same shape with invariant factors p^e + O(p^N) (units dropped) in
+    # order of increasing e, zeros past the rank. Equals U @ self @ V for some matrices U and V
+    # invertible over p-adic integers.
+    def smith_form(self) -> PadicMatrix:
+        ws = _eliminate(self._significand_rows(), self.p, self.N - self.v)[2]
+        s = [0] * (self.rows * self.cols)
+        for i, w in enumerate(ws):
+            s[i * self.cols + i] = _p_power(self.p, w)
+        return PadicMatrix(self.rows, self.cols, self.N, self.v, s, self.p)
+
+    # Determinant is the product of pivots up to sign. Every pivot is known up to O(p^(N - v)) relative
+    # to p^v, while the others multiplying its error have valuations v + w_i; so det of n x n matrix is
+    # known up to O(p^(n*v + N - v + sum of w_i except the last one)). If the rest of the matrix is 0
+    # after r steps, det is 0 up to O(p^(n*v + sum of the w_i + (n - r)*(N - v))).
+    def det(self) -> Padic:
+        n, p = self.rows, self.p
+        if n != self.cols:
+            raise RuntimeError(f"Can't compute determinant of {self.rows}x{self.cols} matrix")
+        K = self.N - self.v
+        a = self._significand_rows()
+        rows, cols, ws = _eliminate(a, p, K)
+        if len(ws) < n:
+            return Padic(n * self.v + sum(ws) + (n - len(ws)) * K, 0, 0, p)
+        m = _p_power(p, K - ws[-1]) if ws else 1
+        s = _parity(rows) * _parity(cols)
+        for i, w in enumerate(ws):
+            s = _mulmod(s, a[i][i] // _p_power(p, w), m)
+        return Padic(n * self.v + K + sum(ws[:-1]), n * self.v + sum(ws), s, p)
+
+    # Solution x of self @ x == b for square self; b is a matrix or a list (then so is x).
+    # p-adic lifting (Dixon's method): self is factored only once, modulo p^k small enough for fast
+    # arithmetic, and then each step finds next k - W digits of x (W is the biggest pivot valuation)
+    # using the factorization, and divides the residual by p^k exactly. Steps take O(n^2) operations
+    # instead of O(n^3) of elimination at full precision. With A = p^v*S, b = p^vb*C, y = S^-1 C:
+    # entries of S^-1 have valuations at least -W, so y is known up to O(p^(min(N_C, N_S + val y) - W)).
+    def solve(self, b: PadicMatrix | list[Padic | int]) -> PadicMatrix | list[Padic]:
+        n, p = self.rows, self.p
+        if n != self.cols:
+            raise RuntimeError(f"Can't solve system with {self.rows}x{self.cols} matrix")
+        vector = not isinstance(b, PadicMatrix)
+        if vector:
+            b = PadicMatrix.from_rows([[x] for x in b], p, self.N)
+        self._check(b)
+        if b.rows != n:
+            raise RuntimeError(f"Can't solve system with {n}x{n} matrix and {b.rows} rows of right side")
+        K, Kb = self.N - self.v, b.N - b.v
+        # Factorization modulo p^k below 2^30 (or with more digits if the steps would dominate otherwise),
+        # k is doubled until W is small enough compared to it
+        k = max(1, 30 // p.bit_length(), Kb // n)
+        while True:
+            m = _p_power(p, k)
+            lu = [[a % m for a in row] for row in self._significand_rows()]
+            rows, cols, ws = _eliminate(lu, p, k)
+            W = ws[-1] if ws else 0
+            if len(ws) == n and W >= K or len(ws) < n and k >= K:
+                raise RuntimeError(f"Can't solve system with matrix singular up to O({p}^{self.N})")
+            if len(ws) == n and 2 * W < k:
+                break
+            k *= 2
+        # L * D * U' with D = diag(p^w_i), U' has unit diagonal
+        lower = [lu[i][:i] for i in range(n)]
+        upper, inverses, scales = [], [], []
+        for i, w in enumerate(ws):
+            pw = _p_power(p, w)
+            upper.append([a // pw for a in lu[i][i + 1:]])
+            inverses.append(_invert(lu[i][i] // pw, m))
+            scales.append(_p_power(p, W - w))
+        rows_s = self._significand_rows()
+        pW = _p_power(p, W)
+        steps = -(-Kb // (k - W)) if Kb > 0 else 0
+        shift = _p_power(p, k - W)
+        out = []
+        for r in (b.s[j::b.cols] for j in range(b.cols)):
+            y, scale = [0] * n, 1
+            for _ in range(steps):
+                # t = p^W * S0^-1 r modulo p^k, S0 = S modulo p^k as factored
+                z = []
+                for i in range(n):
+                    z.append((r[rows[i]] - sum(map(_int_mul, lower[i], z))) % m)
+                t = [0] * n
+                for i in range(n - 1, -1, -1):
+                    t[i] = (scales[i] * z[i] - sum(map(_int_mul, upper[i], t[i + 1:]))) * inverses[i] % m
+                x = [0] * n
+                for i, c in enumerate(cols):
+                    x[c] = t[i]
+                for i in range(n):
+                    y[i] += scale * x[i]
+                r = [(pW * a - sum(map(_int_mul, row, x))) // m for a, row in zip(r, rows_s)]
+                scale *= shift
+            out.append(y)
+        # y is p^W * S^-1 C, so x = p^(vb - v - W) * y
+        vy = min((Padic.val(a, p) for col in out for a in col if a), default=None)
+        Ny = Kb - W if vy is None else min(Kb, K + vy - W) - W
+        e = b.v - self.v
+        s = [out[j][i] for i in range(n) for j in range(b.cols)]
+        x = PadicMatrix(n, b.cols, e + Ny, e - W, s, p)
+        return [x[i, 0] for i in range(n)] if vector else x
+
+    # Inverse matrix, same as solving with identity known up to O(p^(N - v)), so entries are known
+    # up to O(p^(N - 2*v - 2*W)) for the biggest pivot valuation W, as 1/x for numbers.
+    def inverse(self) -> PadicMatrix:
+        return self.solve(PadicMatrix.identity(self.rows, self.p, self.N - self.v))
+
 
 def gcd(a: int, b: int) -> int:
-    if b == 0:
-        return a
-    return gcd(b, a % b)
+    return _math_gcd(a, b)
 
 
+# Exact rational number num/den with den > 0. Results of arithmetic are reduced lazily - only
+# when num, den or anything depending on the reduced form (comparison, hash, printing) is
+# needed - so e.g. Horner scheme with rational x doesn't compute a gcd on every step. Mixes with
+# int and fractions.Fraction (and compares and hashes equal to Fraction of the same value).
 class Rational:
-    def __init__(self, p, q):
-        g = gcd(p, q)
-        self.num = p // g
-        self.den = q // g
+    __slots__ = ('_num', '_den', '_reduced')
+
+    def __init__(self, p: int, q: int = 1) -> None:
+        if q == 0:
+            raise RuntimeError(f"Rational {p}/0 is undefined")
+        if q < 0:
+            p, q = -p, -q
+        self._num: int = p
+        self._den: int = q
+        self._reduced: bool = False
+
+    @staticmethod
+    def _make(p: int, q: int) -> Rational:
+        out = object.__new__(Rational)
+        out._num, out._den, out._reduced = p, q, False
+        return out
+
+    def _reduce(self) -> None:
+        if not self._reduced:
+            g = _math_gcd(self._num, self._den)
+            if g != 1:
+                self._num //= g
+                self._den //= g
+            self._reduced = True
+
+    @property
+    def num(self) -> int:
+        self._reduce()
+        return self._num
+
+    @property
+    def den(self) -> int:
+        self._reduce()
+        return self._den
+
+    # Names used by fractions.Fraction and numbers.Rational.
+    numerator = num
+    denominator = den
+
+    # Numerator and denominator (not necessarily reduced) of supported operand or None.
+    @staticmethod
+    def _parts(x) -> tuple[int, int] | None:
+        if isinstance(x, Rational):
+            return x._num, x._den
+        if isinstance(x, int):
+            return x, 1
+        if isinstance(x, Fraction):
+            return x.numerator, x.denominator
+        return None
+
+    def __add__(self, other: Rational | Fraction | int) -> Rational:
+        o = Rational._parts(other)
+        if o is None:
+            return NotImplemented
+        if o[1] == self._den:
+            return Rational._make(self._num + o[0], self._den)
+        return Rational._make(self._num * o[1] + o[0] * self._den, self._den * o[1])
+
+    __radd__ = __add__
+
+    def __neg__(self) -> Rational:
+        out = Rational._make(-self._num, self._den)
+        out._reduced = self._reduced
+        return out
 
-    def __add__(self, other):
-        return Rational(self.num * other.den + self.den * other.num, self.den * other.den)
+    def __sub__(self, other: Rational | Fraction | int) -> Rational:
+        o = Rational._parts(other)
+        if o is None:
+            return NotImplemented
+        return self + Rational._make(-o[0], o[1])
+
+    def __rsub__(self, other: Fraction | int) -> Rational:
+        return -self + other
+
+    def __mul__(self, other: Rational | Fraction | int) -> Rational:
+        o = Rational._parts(other)
+        if o is None:
+            return NotImplemented
+        return Rational._make(self._num * o[0], self._den * o[1])
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other: Rational | Fraction | int) -> Rational:
+        o = Rational._parts(other)
+        if o is None:
+            return NotImplemented
+        return Rational(self._num * o[1], self._den * o[0])
+
+    def __rtruediv__(self, other: Fraction | int) -> Rational:
+        o = Rational._parts(other)
+        if o is None:
+            return NotImplemented
+        return Rational(o[0] * self._den, o[1] * self._num)
+
+    def __floordiv__(self, other: Rational | Fraction | int) -> int:
+        o = Rational._parts(other)
+        if o is None:
+            return NotImplemented
+        return (self._num * o[1]) // (self._den * o[0])
+
+    # Same as for Fraction: self - other * floor(self / other).
+    def __mod__(self, other: Rational | Fraction | int) -> Rational:
+        o = Rational._parts(other)
+        if o is None:
+            return NotImplemented
+        if o[0] == 0:
+            raise RuntimeError(f"Can't compute {self} modulo 0")
+        return Rational((self._num * o[1]) % (o[0] * self._den), self._den * o[1])
+
+    def __pow__(self, power: int) -> Rational:
+        assert isinstance(power, int)
+        if power < 0:
+            return Rational(self._den ** -power, self._num ** -power)
+        out = Rational._make(self._num ** power, self._den ** power)
+        out._reduced = self._reduced
+        return out
+
+    def __eq__(self, other) -> bool:
+        o = Rational._parts(other)
+        if o is None:
+            return NotImplemented
+        return self._num * o[1] == o[0] * self._den
+
+    def __lt__(self, other: Rational | Fraction | int) -> bool:
+        o = Rational._parts(other)
+        if o is None:
+            return NotImplemented
+        return self._num * o[1] < o[0] * self._den
+
+    def __le__(self, other: Rational | Fraction | int) -> bool:
+        o = Rational._parts(other)
+        if o is None:
+            return NotImplemented
+        return self._num * o[1] <= o[0] * self._den
+
+    def __gt__(self, other: Rational | Fraction | int) -> bool:
+        o = Rational._parts(other)
+        if o is None:
+            return NotImplemented
+        return self._num * o[1] > o[0] * self._den
+
+    def __ge__(self, other: Rational | Fraction | int) -> bool:
+        o = Rational._parts(other)
+        if o is None:
+            return NotImplemented
+        return self._num * o[1] >= o[0] * self._den
+
+    def __hash__(self) -> int:
+        return hash(Fraction(self.num, self.den))
 
-    def __mul__(self, other):
-        return Rational(self.num * other.num, self.den * other.den)
+    def __float__(self) -> float:
+        return self._num / self._den
 
-    def __truediv__(self, other):
-        return Rational(self.num * other.den, self.den * other.num)
+    def __bool__(self) -> bool:
+        return self._num != 0
 
-    def __mod__(self, other):
-        return Rational(self.num % other, self.den % other)
+    def to_fraction(self) -> Fraction:
+        return Fraction(self.num, self.den)
 
-    def __neg__(self):
-        return Rational(-self.num, self.den)
+    def to_padic(self, p: int | None = None, N: int | None = None) -> Padic:
+        return Padic.from_frac(self.num, self.den, p, N)
 
     def __str__(self):
         return str(self.num) + "/" + str(self.den)
 
+    def __repr__(self) -> str:
+        return f"Rational({self.num}, {self.den})"
+
 
 def series(a: Callable[[int], int | Rational | Padic], n: int, z='p') -> \
                                     Callable[[int | Rational], Rational] \
@@ -328,84 +1896,569 @@ def series(a: Callable[[int], int | Rational | Padic], n: int, z='p') -> \
         return lambda x, p=None: u2(x, p)
 
 
-@lru_cache(maxsize=1000)
+@_cached('factorials', 1000)
 def factorial(n):
-    return n * factorial(n - 1) if n else 1
-
-
-@lru_cache(maxsize=1000)
+    return _math_factorial(n)
+
+
+# 1/n! known up to O(p^N).
+# Table is extended in batches (at least doubling its size, as series ask for coefficients
+# one by one): unit part of the biggest factorial is inverted once and inverses of the smaller
+# ones are obtained by multiplying it by k / p^v(k) going down.
+@_traced
+def inverse_factorial(n: int, p: int, N: int) -> Padic:
+    table = _inverse_factorial_table(p, N, _cap())
+    if len(table) <= n:
+        start = len(table)
+        end = max(n, 2 * start)
+        w = _factorial_val(end, p)
+        inv = _invert(_math_factorial(end) // _p_power(p, w), _p_power(p, N + w))
+        batch = []
+        for k in range(end, start - 1, -1):
+            batch.append(Padic(N, -w, inv, p))
+            v = Padic.val(k, p)
+            w -= v
+            inv = _mulmod(inv, k // _p_power(p, v), _p_power(p, N + w))
+        table.extend(reversed(batch))
+    return table[n]
+
+
+@_cached('inverse_factorials', 256)
+def _inverse_factorial_table(p: int, N: int, cap: int | None) -> list[Padic]:
+    return [Padic.from_int(1, p, N)]
+
+
+@_traced
 def binomial_coeff(a: Padic | int, b: int, p: int | None = None) -> Padic:
     if p is None:
         p = a.p
-    return Padic.from_int(1, p) if b == 0 else binomial_coeff(a, b - 1, p) / b * (a - b + 1)
+    table = _binomial_table((a.p, a.N, a.v, a.s) if isinstance(a, Padic) else a, p, _cap())
+    if not table:
+        table.append(Padic.from_int(1, p))
+    while len(table) <= b:
+        k = len(table)
+        table.append(table[-1] / k * (a - k + 1))
+    return table[b]
+
+
+# Binomial coefficients C(a, k) for k = 0, 1, ... Padic a is given as a tuple (p, N, v, s),
+# so that numbers differing in precision or prime don't share the table.
+@_cached('binomial_coefficients', 256)
+def _binomial_table(a: tuple[int, int, int, int] | int, p: int, cap: int | None) -> list[Padic]:
+    return []
+
+
+# Coefficients of series defining log, exp, sin and cos computed with default integer precision.
+# They don't depend on target precision: the table is filled with the cap suspended, otherwise
+# 1/n! would be a division by a factorial truncated to 0 by the cap.
+_SERIES_COEFFICIENTS: dict[str, Callable[[int, int], int | Padic]] = {
+    'log': lambda n, p: Padic.from_frac(1, n, p) if n != 0 else Padic.from_int(0, p),
+    'exp': lambda n, p: Padic.from_frac(1, factorial(n), p),
+    'sin': lambda n, p: Padic.from_frac(1, factorial(n), p) * (-1) ** ((n - 1) // 2) if n % 2 else 0,
+    'cos': lambda n, p: Padic.from_frac(1, factorial(n), p) * (-1) ** ((n + 1) // 2) if (n - 1) % 2 else 0,
+}
+
+
+def _series_coefficient(name: str, n: int, p: int) -> int | Padic:
+    table = _series_table(name, p, Padic.INTEGER_PRECISION)
+    if len(table) <= n:
+        prev, Padic.TARGET_PRECISION = Padic.TARGET_PRECISION, None
+        try:
+            while len(table) <= n:
+                table.append(_SERIES_COEFFICIENTS[name](len(table), p))
+        finally:
+            Padic.TARGET_PRECISION = prev
+    return table[n]
+
+
+@_cached('series_coefficients', 256)
+def _series_table(name: str, p: int, N: int) -> list[int | Padic]:
+    return []
+
+
+# Sums power series sum a(k, M) x^k up to O(p^digits). a(k, M) should return k-th coefficient
+# known at least up to O(p^M). coef_val(k) is a lower bound for valuation of k-th coefficient
+# such that coef_val(k) + k * v(x) is non-decreasing and unbounded - then terms for which it
+# reaches digits don't contribute and are skipped. Each step of Horner scheme is done only
+# at precision it needs.
+@_traced
+def truncated_series(a: Callable[[int, int], int | Padic], coef_val: Callable[[int], int], x: int | Padic,
+                     digits: int, p: int | None = None) -> Padic:
+    if p is None:
+        p = x.p
+    if isinstance(x, int):
+        x = Padic.from_int(x, p, digits)
+    v = x.v
+    terms = 0
+    while coef_val(terms) + terms * v < digits:
+        terms += 1
+    lowest = min([0] + [coef_val(k) for k in range(terms)])
+    if x.N > digits - lowest:
+        x = x.with_precision(digits - lowest)
+    coefficients = [a(k, digits - k * v) for k in range(terms)]
+    out = Padic.from_int(0, p, digits)
+    for k in range(terms - 1, -1, -1):
+        out = out * x + coefficients[k]
+        if out.N > digits - k * v:
+            out = out.with_precision(digits - k * v)
+    return out
+
+
+# Floor of logarithm of n >= 1 base p.
+def _ilog(n: int, p: int) -> int:
+    out = 0
+    while n >= p:
+        n //= p
+        out += 1
+    return out
+
+
+# a/b known up to O(p^M).
+def _frac(a: int, b: int, p: int, M: int) -> Padic:
+    w = Padic.val(b, p)
+    return Padic.from_frac(a, b, p, M + 2 * w)
+
+
+# Valuation of x, checking that power series with coefficients of valuation
+# at least -k/(p-1) (like exp) converges at x.
+def _exp_radius_val(x: Padic | int, p: int) -> int:
+    v = Padic.val(x, p)
+    if v * (p - 1) <= 1 and x != 0:
+        raise RuntimeError(f"Series doesn't converge at {x}")
+    return v
+
+
+def _exp_coef_val(p: int) -> Callable[[int], int]:
+    return lambda k: -(max(k - 1, 0) // (p - 1))
+
+
+# Binary splitting of sum of c^n/n! for a <= n < b. Returns P, Q, T such that P = c^(b-a),
+# Q = a(a+1)...(b-1) and the sum equals T/Q * c^(a-1)/(a-1)!. All of them are reduced mod m.
+def _exp_split(c: int, a: int, b: int, m: int) -> tuple[int, int, int]:
+    if b - a == 1:
+        return c, a, c
+    mid = (a + b) // 2
+    P1, Q1, T1 = _exp_split(c, a, mid, m)
+    P2, Q2, T2 = _exp_split(c, mid, b, m)
+    return _mulmod(P1, P2, m), _mulmod(Q1, Q2, m), (T1 * Q2 + P1 * T2) % m
+
+
+# Valuation of n! by Legendre's formula.
+def _factorial_val(n: int, p: int) -> int:
+    out = 0
+    while n:
+        n //= p
+        out += n
+    return out
+
+
+# T/Q up to O(p^digits), where T and Q are known modulo p^(digits + 2 v(Q)).
+def _split_result(T: int, Q: int, p: int, digits: int) -> Padic:
+    N = digits + 2 * Padic.val(Q, p)
+    return Padic.from_int(T, p, N) / Padic.from_int(Q, p, N)
+
+
+# Splits x into blocks of p-adic digits [v, 2v), [2v, 4v), ... and multiplies exp of blocks.
+# Block starting at digit k has at most 2k digits and needs about digits/k terms of the series,
+# which are summed exactly by binary splitting with a single division at the end.
+def _exp_fast(x: Padic, digits: int) -> Padic:
+    p = x.p
+    v = _exp_radius_val(x, p)
+    digits = min(digits, x.N)
+    X = x.s * p ** x.v if x.s else 0
+    out = Padic.from_int(1, p, digits)
+    lo = v
+    while lo < digits:
+        hi = min(2 * lo, digits)
+        c = X % p ** hi - X % p ** lo
+        lo = hi
+        if c == 0:
+            continue
+        v_c = Padic.val(c, p)
+        terms = 1
+        while terms * v_c - (terms - 1) // (p - 1) < digits:
+            terms += 1
+        if terms > 1:
+            m = p ** (digits + 2 * _factorial_val(terms - 1, p))
+            _, Q, T = _exp_split(c, 1, terms, m)
+            out = out * (1 + _split_result(T, Q, p, digits))
+    return out.with_precision(digits) if out.N > digits else out
+
+
+# Solves exp(z) = x by Newton iteration z -> z + x * exp(-z) - 1 which doubles number of correct
+# digits each step (for p = 2 one digit less) and uses only fast exp at the current precision.
+# For p = 2 and x = 3 + O(4) solution doesn't exist, but log(x) = log(-x) in that case.
+def _log_fast(x: Padic, digits: int) -> Padic:
+    p = x.p
+    if Padic.val(x - 1) < 1:
+        raise RuntimeError(f"Series doesn't converge at {1 - x}")
+    digits = min(digits, x.N)
+    if p == 2 and x.s % 4 == 3:
+        x = -x
+    k = min(digits, 16)
+    z = -truncated_series(lambda n, M: _frac(1, n, p, M) if n != 0 else 0,
+                          lambda n: -_ilog(n, p) if n else 0, 1 - x, k, p)
+    while k < digits:
+        k = min(2 * k - (p == 2), digits)
+        z = z.with_precision(k)
+        z = z + x.with_precision(k) * _exp_fast(-z, k) - 1
+    return z
 
 
 # Convergent for x = 1 + O(p)
-def log(x: int | Padic, p: int | None = None, N: int = 100) -> Padic:
+# If digits is given, N is ignored and result is computed up to O(p^digits).
+@_traced
+def log(x: int | Padic, p: int | None = None, N: int = 100, digits: int | None = None) -> Padic:
     if p is None:
         p = x.p
-    return -series(lambda n: Padic.from_frac(1, n, p) if n != 0 else Padic.from_int(0, p), N)(1 - x, p)
+    if digits is not None:
+        digits = _capped(digits)
+        return _log_fast(x if isinstance(x, Padic) else Padic.from_int(x, p, digits), digits)
+    return -series(lambda n: _series_coefficient('log', n, p), N)(1 - x, p)
 
 
 # Convergent for |x|_p < p^{-1/{p-1}}
-def exp(x: int | Padic, p: int | None = None, N: int = 100) -> Padic:
+@_traced
+def exp(x: int | Padic, p: int | None = None, N: int = 100, digits: int | None = None) -> Padic:
     if p is None:
         p = x.p
-    return series(lambda n: Padic.from_frac(1, factorial(n), p), N)(x, p)
+    if digits is not None:
+        digits = _capped(digits)
+        return _exp_fast(x if isinstance(x, Padic) else Padic.from_int(x, p, digits), digits)
+    return series(lambda n: _series_coefficient('exp', n, p), N)(x, p)
 
 
 # Convergent for |x|_p < p^{-1/{p-1}}
-def sin(x: int | Padic, p: int | None = None, N: int = 100) -> Padic:
+@_traced
+def sin(x: int | Padic, p: int | None = None, N: int = 100, digits: int | None = None) -> Padic:
     if p is None:
         p = x.p
-    return series(lambda n: Padic.from_frac(1, factorial(n), p) * (-1) ** ((n - 1) // 2) if n % 2 else 0, N)(x, p)
+    if digits is not None:
+        digits = _capped(digits)
+        _exp_radius_val(x, p)
+        return truncated_series(lambda n, M: (-1) ** ((n - 1) // 2) * inverse_factorial(n, p, digits) if n % 2 else 0,
+                                _exp_coef_val(p), x, digits, p)
+    return series(lambda n: _series_coefficient('sin', n, p), N)(x, p)
 
 
 # Convergent for |x|_p < p^{-1/{p-1}}
-def cos(x: int | Padic, p: int | None = None, N: int = 100) -> Padic:
+@_traced
+def cos(x: int | Padic, p: int | None = None, N: int = 100, digits: int | None = None) -> Padic:
     if p is None:
         p = x.p
-    return series(lambda n: Padic.from_frac(1, factorial(n), p) * (-1) ** ((n + 1) // 2) if (n - 1) % 2 else 0, N)(x, p)
+    if digits is not None:
+        digits = _capped(digits)
+        _exp_radius_val(x, p)
+        return truncated_series(lambda n, M: (-1) ** (n // 2) * inverse_factorial(n, p, digits) if n % 2 == 0 else 0,
+                                _exp_coef_val(p), x, digits, p)
+    return series(lambda n: _series_coefficient('cos', n, p), N)(x, p)
 
 
 # Convergence radius dependent on p and a
-def binomial(x: int | Padic, a: int | Padic, p: int | None = None, N: int = 100) -> Padic:
+@_traced
+def binomial(x: int | Padic, a: int | Padic, p: int | None = None, N: int = 100, digits: int | None = None) -> Padic:
     if p is None:
-        if isinstance(x, Padic):
-            p = x.p
-        p = a.p
+        p = x.p if isinstance(x, Padic) else a.p
+    if digits is not None:
+        digits = _capped(digits)
+        return _binomial_digits(x - 1, a, p, digits)
     return series(lambda n: binomial_coeff(a, n, p), N)(x - 1, p)
 
 
+# For integer a binomial coefficients are integers and are computed exactly.
+# Otherwise v(C(a, n)) >= n * v(a) - v(n!) if v(a) < 0 and v(C(a, n)) >= 0 if v(a) >= 0.
+def _binomial_digits(y: int | Padic, a: int | Padic, p: int, digits: int) -> Padic:
+    w = min(0, Padic.val(a, p))
+    v = Padic.val(y, p)
+    if v < 1 or (v + w) * (p - 1) <= (1 if w < 0 else 0):
+        raise RuntimeError(f"Series doesn't converge at {y}")
+    if isinstance(a, int):
+        coefficients = [1]
+
+        def coef(n: int, M: int) -> Padic:
+            while len(coefficients) <= n:
+                k = len(coefficients)
+                coefficients.append(coefficients[-1] * (a - k + 1) // k)
+            return Padic.from_int(coefficients[n], p, M)
+
+        return truncated_series(coef, lambda n: 0, y, digits, p)
+    return truncated_series(lambda n, M: binomial_coeff(a, n, p), lambda n: n * w - (max(n - 1, 0) // (p - 1) if w else 0),
+                            y, digits, p)
+
+
+# Polynomial with p-adic or integer coefficients, lowest degree first. Integer coefficients
+# are kept exact. Evaluated by Horner scheme.
+class PadicPolynomial:
+    def __init__(self, coef: list[Padic | int], p: int | None = None) -> None:
+        if p is None:
+            p = next((c.p for c in coef if isinstance(c, Padic)), Padic.DEFAULT_PRIME)
+        coef = list(coef)
+        while len(coef) > 1 and isinstance(coef[-1], int) and coef[-1] == 0:
+            coef.pop()
+        self.coef: list[Padic | int] = coef if coef else [0]
+        self.p: int = p
+
+    # Converts numpy polynomial. Coefficients that aren't p-adic have to be integers (possibly stored as floats).
+    @staticmethod
+    def from_numpy(poly: Polynomial, p: int | None = None) -> PadicPolynomial:
+        return PadicPolynomial([c if isinstance(c, Padic) else int(c) for c in poly.coef], p)
+
+    def degree(self) -> int:
+        return len(self.coef) - 1
+
+    def __call__(self, x: Padic | int) -> Padic | int:
+        out = self.coef[-1]
+        for c in self.coef[-2::-1]:
+            out = out * x + c
+        return PadicPolynomial._like(out, x)
+
+    # Computes f(x) and f'(x) in a single Horner pass.
+    def value_and_deriv(self, x: Padic | int) -> tuple[Padic | int, Padic | int]:
+        value, der = self.coef[-1], 0
+        for c in self.coef[-2::-1]:
+            der = der * x + value
+            value = value * x + c
+        return PadicPolynomial._like(value, x), PadicPolynomial._like(der, x)
+
+    # Constant polynomials evaluate to integers, this makes them p-adic if x is.
+    @staticmethod
+    def _like(value: Padic | int, x: Padic | int) -> Padic | int:
+        if isinstance(value, int) and isinstance(x, Padic):
+            return Padic.from_int(value, x.p, x.N)
+        return value
+
+    # Evaluates polynomial at all the points at once.
+    def eval_many(self, xs: PadicArray | list[Padic | int]) -> PadicArray:
+        if not isinstance(xs, PadicArray):
+            xs = PadicArray.from_padics([x if isinstance(x, Padic) else Padic.from_int(x, self.p) for x in xs], self.p)
+        if len(self.coef) == 1:
+            return 0 * xs + self.coef[0]
+        out = xs * self.coef[-1] + self.coef[-2]
+        for c in self.coef[-3::-1]:
+            out = out * xs + c
+        return out
+
+    def deriv(self) -> PadicPolynomial:
+        return PadicPolynomial([c * i for i, c in enumerate(self.coef)][1:], self.p)
+
+    # Polynomial with integer coefficients congruent to these mod p^k.
+    def reduce(self, k: int) -> PadicPolynomial:
+        m = self.p ** k
+        out = []
+        for c in self.coef:
+            if isinstance(c, Padic):
+                if c.v < 0:
+                    raise RuntimeError(f"Can't reduce {c} modulo {self.p}^{k}")
+                c = c.s * self.p ** c.v
+            out.append(c % m)
+        return PadicPolynomial(out, self.p)
+
+    def __str__(self) -> str:
+        return ' + '.join(f"({c})x^{i}" if i else f"({c})" for i, c in enumerate(self.coef))
+
+    def __repr__(self) -> str:
+        return str(self)
+
+
+def _as_padic_polynomial(poly: Polynomial | PadicPolynomial, p: int | None = None) -> PadicPolynomial:
+    if isinstance(poly, PadicPolynomial):
+        return poly
+    return PadicPolynomial.from_numpy(poly, p)
+
+
+# Coefficients of poly as integers (lowest degree first), divided by the power of p dividing
+# all of them (multiplied if some have negative valuation), which doesn't change the roots.
+# Second value is the precision up to which these integers are known (None if all coefficients
+# are exact).
+def _integer_coefficients(poly: PadicPolynomial, p: int) -> tuple[list[int], int | None]:
+    shift = min((c.v if isinstance(c, Padic) else Padic.val(int(c), p) for c in poly.coef
+                 if isinstance(c, Padic) or int(c) != 0), default=0)
+    out = []
+    precision = None
+    for c in poly.coef:
+        if isinstance(c, Padic):
+            out.append(c.s * p ** (c.v - shift))
+            if precision is None or c.N - shift < precision:
+                precision = c.N - shift
+        elif shift < 0:
+            out.append(int(c) * p ** (-shift))
+        else:
+            out.append(int(c) // p ** shift)
+    while out and out[-1] == 0:
+        out.pop()
+    return out, precision
+
+
+def _horner(coef: list[int], x: int, m: int | None = None) -> int:
+    out = 0
+    for c in reversed(coef):
+        if m is None:
+            out = out * x + c
+        else:
+            out = (_mulmod(out, x, m) + c) % m
+    return out
+
+
+def _poly_deriv(coef: list[int]) -> list[int]:
+    return [i * c for i, c in enumerate(coef)][1:]
+
+
+# Polynomials over F_p are lists of coefficients, lowest degree first, without leading zeros.
+def _poly_trim(a: list[int], p: int) -> list[int]:
+    a = [c % p for c in a]
+    while a and a[-1] == 0:
+        a.pop()
+    return a
+
+
+def _poly_divmod(a: list[int], b: list[int], p: int) -> tuple[list[int], list[int]]:
+    a = list(a)
+    inv = pow(b[-1], -1, p)
+    q = [0] * max(len(a) - len(b) + 1, 0)
+    for i in range(len(a) - len(b), -1, -1):
+        c = a[i + len(b) - 1] * inv % p
+        q[i] = c
+        if c:
+            for j, bj in enumerate(b):
+                a[i + j] = (a[i + j] - c * bj) % p
+    return _poly_trim(q, p), _poly_trim(a[:len(b) - 1], p)
+
+
+def _poly_mulmod(a: list[int], b: list[int], f: list[int], p: int) -> list[int]:
+    out = [0] * (len(a) + len(b) - 1) if a and b else []
+    for i, ai in enumerate(a):
+        if ai:
+            for j, bj in enumerate(b):
+                out[i + j] += ai * bj
+    return _poly_divmod(_poly_trim(out, p), f, p)[1]
+
+
+def _poly_powmod(a: list[int], e: int, f: list[int], p: int) -> list[int]:
+    out = [1]
+    a = _poly_divmod(a, f, p)[1]
+    while e:
+        if e & 1:
+            out = _poly_mulmod(out, a, f, p)
+        a = _poly_mulmod(a, a, f, p)
+        e >>= 1
+    return out
+
+
+# Monic gcd of polynomials over F_p.
+def _poly_gcd(a: list[int], b: list[int], p: int) -> list[int]:
+    while b:
+        a, b = b, _poly_divmod(a, b, p)[1]
+    inv = pow(a[-1], -1, p)
+    return [c * inv % p for c in a]
+
+
+# Distinct roots in F_p of polynomial f with coefficients reduced mod p.
+# For small p just checks every residue, otherwise splits gcd(f, x^p - x) which is product of
+# (x - r) over all roots r, by Cantor-Zassenhaus algorithm.
+def _roots_mod_p(f: list[int], p: int) -> list[int]:
+    if len(f) <= 1:
+        return []
+    if p < 100:
+        return [r for r in range(p) if _horner(f, r, p) == 0]
+    g = _poly_powmod([0, 1], p, f, p) + [0, 0]
+    g[1] -= 1
+    g = _poly_gcd(f, _poly_trim(g, p), p)
+    out = []
+    stack = [g]
+    from random import Random
+    rng = Random(p)
+    while stack:
+        g = stack.pop()
+        if len(g) == 1:
+            continue
+        if len(g) == 2:
+            out.append(-g[0] % p)
+            continue
+        h = _poly_powmod([rng.randrange(p), 1], (p - 1) // 2, g, p)
+        d = _poly_gcd(g, _poly_trim([h[0] - 1] + h[1:] if h else [-1], p), p)
+        if 1 < len(d) < len(g):
+            stack.append(d)
+            stack.append(_poly_divmod(g, d, p)[0])
+        else:
+            stack.append(g)
+    return sorted(out)
+
+
+# g(x + t) for integer polynomial g.
+def _taylor_shift(g: list[int], t: int) -> list[int]:
+    g = list(g)
+    for i in range(len(g) - 1):
+        for j in range(len(g) - 2, i - 1, -1):
+            g[j] += t * g[j + 1]
+    return g
+
+
+# Lifts simple root t of g mod p to a root mod p^digits by Newton iteration with precision doubling.
+def _lift_simple_root(g: list[int], t: int, p: int, digits: int) -> int:
+    der = _poly_deriv(g)
+    inv = pow(_horner(der, t, p), -1, p)
+    k = 1
+    while k < digits:
+        k = min(2 * k, digits)
+        m = p ** k
+        inv = _mulmod(inv, 2 - _mulmod(_horner(der, t, m), inv, m), m)
+        t = (t - _horner(g, t, m) * inv) % m
+    return t % p ** digits
+
+
+# Walks the tree of roots of f mod p^k. Node r, k stores g with f(r + p^k y) = p^e g(y) and
+# g mod p != 0, so its children are r + p^k t for roots t of g mod p, at most deg f of them.
+# Simple roots of g mod p are lifted by Newton iteration right away.
+# Yields integers r such that r + O(p^digits) contains a root of f.
+def _root_tree(f: list[int], p: int, digits: int):
+    e = min(Padic.val(c, p) for c in f if c)
+    stack = [(0, 0, [c // p ** e for c in f])]
+    while stack:
+        r, k, g = stack.pop()
+        if k >= digits:
+            yield r
+            continue
+        gp = _poly_trim(g, p)
+        der = _poly_trim(_poly_deriv(gp), p)
+        for t in reversed(_roots_mod_p(gp, p)):
+            if _horner(der, t, p):
+                yield r + p ** k * _lift_simple_root(g, t, p, digits - k)
+                continue
+            h = _taylor_shift(g, t)
+            h = [c * p ** j for j, c in enumerate(h)]
+            e = min(Padic.val(c, p) for c in h if c)
+            stack.append((r + p ** k * t, k + 1, [c // p ** e for c in h]))
+
+
+# Finds all roots of a polynomial in Z_p, each known up to O(p^digits).
+# Roots closer to each other than p^-digits are found only once.
+@_traced
+def roots(poly: Polynomial | PadicPolynomial, p: int | None = None, digits: int | None = None) -> list[Padic]:
+    poly = _as_padic_polynomial(poly, p)
+    p = poly.p
+    digits = _capped(Padic.INTEGER_PRECISION if digits is None else digits)
+    f, precision = _integer_coefficients(poly, p)
+    if not f:
+        raise RuntimeError("Every element of Z_p is a root of zero polynomial")
+    if precision is not None:
+        digits = min(digits, precision)
+    return [Padic.from_int(r, p, digits) for r in _root_tree(f, p, digits)]
+
+
 # Finds approximate root of a polynomial
 # or doesn't.
 # Currently checks for roots in Z_p only.
-def find_approx_root(poly: Polynomial, p: int | None = None, depth: int = 5) -> Padic:
-    der = poly.deriv()
-
-    def check_path(x, i):
-        v1 = Padic.val(poly(x), p)
-        v2 = Padic.val(der(x), p)
-        return 1 if v1 > 2 * v2 else 2 if v1 <= i else 0
-
-    if p is None:
-        p = poly.coef[0].p
-    previous_paths = []
-    current_paths = [Padic.from_int(0, p)]
-    ppow = 1
-    for i in range(depth):
-        previous_paths = current_paths
-        current_paths = []
-        for path in previous_paths:
-            for k in range(p):
-                current_paths.append(path + k * ppow)
-        for path in current_paths:
-            res = check_path(path, i)
-            if res == 1:
-                return path
-            if res == 2:
-                current_paths.remove(path)
-        ppow *= p
+@_traced
+def find_approx_root(poly: Polynomial | PadicPolynomial, p: int | None = None, depth: int = 5) -> Padic:
+    poly = _as_padic_polynomial(poly, p)
+    p = poly.p
+    f, precision = _integer_coefficients(poly, p)
+    m = None if precision is None else p ** precision
+    der = _poly_deriv(f)
+    for r in _root_tree(f, p, depth) if f else [0]:
+        value = _horner(f, r, m)
+        if value == 0 or Padic.val(value, p) > 2 * Padic.val(_horner(der, r, m), p):
+            return Padic.from_int(r, p)
     raise RuntimeError("Root not found!")
 
 
@@ -414,15 +2467,650 @@ def find_approx_root(poly: Polynomial, p: int | None = None, depth: int = 5) ->
 # Doesn't verify correctness of given approximate root.
 # Note that in fact GHL (Generalised Hensel Lemma) for polynomial roots is used
 # Currently checks for roots in Z_p only
-def hensel(poly: Polynomial, approx: Padic | int | None = None, p: int | None = None, N: int = 100) -> Padic:
-    if p is None:
+# If digits is given, N is ignored and root is lifted until it's known up to O(p^digits).
+@_traced
+def hensel(poly: Polynomial | PadicPolynomial, approx: Padic | int | None = None, p: int | None = None,
+           N: int = 100, digits: int | None = None) -> Padic:
+    if p is None and isinstance(approx, Padic):
         p = approx.p
+    poly = _as_padic_polynomial(poly, p)
+    p = poly.p
     if approx is None:
         approx = find_approx_root(poly)
     if isinstance(approx, int):
         approx = Padic.from_int(approx, p)
-    der = poly.deriv()
+    if digits is not None:
+        digits = _capped(digits)
+        return _newton_lift(poly, poly.deriv(), approx, digits)
     out = approx
     for _ in range(N):
-        out -= poly(out) / der(out)
+        value, der = poly.value_and_deriv(out)
+        out -= value / der
+    return out
+
+
+# Newton iteration with precision doubling. If x is correct up to O(p^k) then next iterate is
+# correct up to O(p^{2k - d}) where d = v(f'(x)), so each step works only at precision it needs.
+# Inverse of derivative is computed once and then updated by Newton iteration for 1/f'(x).
+def _newton_lift(poly: PadicPolynomial, der: PadicPolynomial, x: Padic, digits: int) -> Padic:
+    d = Padic.val(der(x))
+    k = Padic.val(poly(x)) - d
+    if k <= d:
+        raise RuntimeError(f"{x} doesn't satisfy assumptions of Hensel's lemma")
+    t = 1 / der(x)
+    while k < digits:
+        k = min(2 * k - d, digits)
+        x = x.with_precision(k + d)
+        t = t.with_precision(k - d)
+        t = t * (2 - der(x) * t)
+        x = x - poly(x) * t
+    return x.with_precision(digits) if x.N > digits else x
+
+
+# p-adic number whose digits are computed on demand. approx(N) has to return the number known at
+# least up to O(p^N). The best approximation computed so far is cached and whenever more digits are
+# needed precision is at least doubled, so asking for digits one by one costs about as much as
+# asking for all of them at once. Padic operands are taken with their own (finite) precision.
+class LazyPadic:
+    # Numbers with no non-zero digit among first MAX_PRECISION ones are treated as zero
+    # when exact valuation is needed (e.g. for division).
+    MAX_PRECISION: int = 1024
+
+    def __init__(self, approx: Callable[[int], Padic], p: int | None = None) -> None:
+        if p is None:
+            p = Padic.DEFAULT_PRIME
+        self.p: int = p
+        self._approx: Callable[[int], Padic] = approx
+        self._cached: Padic | None = None
+        self._digits: list[int] = []
+
+    @staticmethod
+    def from_int(a: int, p: int | None = None) -> LazyPadic:
+        return LazyPadic(lambda N: Padic.from_int(a, p, max(N, 1)), p)
+
+    @staticmethod
+    def from_frac(a: int, b: int, p: int | None = None) -> LazyPadic:
+        if p is None:
+            p = Padic.DEFAULT_PRIME
+        return LazyPadic(lambda N: Padic.from_frac(a, b, p, max(N, 1) + 2 * Padic.val(b, p)), p)
+
+    @staticmethod
+    def from_padic(x: Padic) -> LazyPadic:
+        return LazyPadic(lambda N: x, x.p)
+
+    # Root of polynomial closest to approx. Each extension starts Newton iteration from the
+    # best root computed so far.
+    @staticmethod
+    def hensel(poly: Polynomial | PadicPolynomial, approx: Padic | int | None = None,
+               p: int | None = None) -> LazyPadic:
+        if p is None and isinstance(approx, Padic):
+            p = approx.p
+        poly = _as_padic_polynomial(poly, p)
+        if approx is None:
+            approx = find_approx_root(poly)
+        out = LazyPadic(lambda N: hensel(poly, out._cached or approx, poly.p, digits=max(N, 1)), poly.p)
+        return out
+
+    @staticmethod
+    def _lift(x: LazyPadic | Padic | int, p: int) -> LazyPadic:
+        if isinstance(x, LazyPadic) and x.p == p:
+            return x
+        if isinstance(x, Padic) and x.p == p:
+            return LazyPadic.from_padic(x)
+        if isinstance(x, int):
+            return LazyPadic.from_int(x, p)
+        raise RuntimeError(f"Can't convert {x} to lazy {p}-adic number")
+
+    # The number known at least up to O(p^N) (or with its full precision if it has a finite one).
+    def approx(self, N: int) -> Padic:
+        if self._cached is None or self._cached.N < N:
+            self._cached = self._approx(N if self._cached is None else max(N, 2 * self._cached.N))
+        return self._cached.with_precision(N) if self._cached.N > N else self._cached
+
+    # Lower bound for valuation, exact if valuation is negative.
+    def _val_bound(self) -> int:
+        return min(0, self.approx(1).v)
+
+    def valuation(self) -> int:
+        N = 8
+        while N <= LazyPadic.MAX_PRECISION:
+            x = self.approx(N)
+            if x.v < x.N:
+                return x.v
+            N *= 2
+        return LazyPadic.MAX_PRECISION
+
+    # Coefficient of p^k.
+    def digit(self, k: int) -> int:
+        if 0 <= k < len(self._digits):
+            return self._digits[k]
+        x = self.approx(k + 1)
+        return 0 if k < x.v or k >= x.N else x.s // _p_power(self.p, k - x.v) % self.p
+
+    # Generator of digits at positions start, start + 1, ... Digits at non-negative positions are
+    # cached and computed in batches.
+    def digits(self, start: int = 0):
+        k = start
+        while True:
+            if k < 0:
+                yield self.digit(k)
+            else:
+                if k >= len(self._digits):
+                    self._extend_digits(k + 1)
+                yield self._digits[k]
+            k += 1
+
+    def _extend_digits(self, n: int) -> None:
+        x = self.approx(max(n, 2 * len(self._digits), 8))
+        start = len(self._digits)
+        if x.N <= start:
+            raise RuntimeError(f"Digits at position {start} and further are unknown for {x}")
+        zeros = min(max(x.v - start, 0), x.N - start)
+        self._digits.extend([0] * zeros)
+        shift = len(self._digits) - x.v
+        if len(self._digits) < x.N:
+            rest = x.s // _p_power(self.p, shift)
+            for _ in range(x.N - len(self._digits)):
+                rest, d = divmod(rest, self.p)
+                self._digits.append(d)
+
+    def __iter__(self):
+        return self.digits()
+
+    def __getitem__(self, k: int) -> int:
+        return self.digit(k)
+
+    def __add__(self, other: LazyPadic | Padic | int) -> LazyPadic:
+        other = LazyPadic._lift(other, self.p)
+        return LazyPadic(lambda N: self.approx(N) + other.approx(N), self.p)
+
+    def __radd__(self, other: Padic | int) -> LazyPadic:
+        return self + other
+
+    def __neg__(self) -> LazyPadic:
+        return LazyPadic(lambda N: -self.approx(N), self.p)
+
+    def __sub__(self, other: LazyPadic | Padic | int) -> LazyPadic:
+        return self + (-LazyPadic._lift(other, self.p))
+
+    def __rsub__(self, other: Padic | int) -> LazyPadic:
+        return LazyPadic._lift(other, self.p) - self
+
+    def __mul__(self, other: LazyPadic | Padic | int) -> LazyPadic:
+        other = LazyPadic._lift(other, self.p)
+
+        def approx(N: int) -> Padic:
+            return self.approx(N - other._val_bound()) * other.approx(N - self._val_bound())
+        return LazyPadic(approx, self.p)
+
+    def __rmul__(self, other: Padic | int) -> LazyPadic:
+        return self * other
+
+    def __truediv__(self, other: LazyPadic | Padic | int) -> LazyPadic:
+        return LazyPadic._divide(self, LazyPadic._lift(other, self.p))
+
+    def __rtruediv__(self, other: Padic | int) -> LazyPadic:
+        return LazyPadic._divide(LazyPadic._lift(other, self.p), self)
+
+    @staticmethod
+    def _divide(a: LazyPadic, b: LazyPadic) -> LazyPadic:
+        def approx(N: int) -> Padic:
+            w = b.valuation()
+            if w >= LazyPadic.MAX_PRECISION:
+                raise RuntimeError(f"Lazy {b.p}-adic number has no non-zero digits among first "
+                                        f"{LazyPadic.MAX_PRECISION}")
+            return a.approx(max(N + w, 1)) / b.approx(max(N + 2 * w - a._val_bound(), w + 1))
+        return LazyPadic(approx, a.p)
+
+    def __pow__(self, power: int) -> LazyPadic:
+        assert isinstance(power, int)
+        if power < 0:
+            return 1 / self ** (-power)
+        out = LazyPadic.from_int(1, self.p)
+        base = self
+        while power:
+            if power & 1:
+                out = out * base
+            power >>= 1
+            if power:
+                base = base * base
+        return out
+
+    def __eq__(self, other: LazyPadic | Padic | int) -> bool:
+        return (self - other).approx(Padic.PRECISION).v >= Padic.PRECISION
+
+    def __str__(self) -> str:
+        return str(self.approx(Padic.PRECISION) if self._cached is None else self._cached)
+
+    def __repr__(self) -> str:
+        return str(self)
+
+
+# Deferred evaluation of p-adic formulas. Operations on PadicExpr are recorded as nodes of
+# a PadicGraph instead of being computed. Nodes are hash-consed, so a subexpression built twice
+# (e.g. x * y and y * x) is a single node evaluated once. evaluate computes the whole graph in one
+# pass in creation order (children are always created before parents). If digits are given,
+# precision needed at every node is found going backwards from the outputs, using valuations
+# from the previous pass (or of inputs in the first one), and inputs are truncated accordingly.
+# If outputs still come out less precise, the pass is repeated with doubled guard digits.
+class PadicGraph:
+    def __init__(self, p: int | None = None) -> None:
+        if p is None:
+            p = Padic.DEFAULT_PRIME
+        self.p: int = p
+        self._ops: list[str] = []
+        self._args: list[tuple[int, ...]] = []
+        self._params: list = []
+        self._constants: dict[int, Padic | int] = {}
+        self._index: dict[tuple, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._ops)
+
+    def _node(self, op: str, args: tuple[int, ...] = (), param=None) -> PadicExpr:
+        key = (op, args, param)
+        i = self._index.get(key)
+        if i is None:
+            i = self._index[key] = len(self._ops)
+            self._ops.append(op)
+            self._args.append(args)
+            self._params.append(param)
+        return PadicExpr(self, i)
+
+    def var(self, name: str) -> PadicExpr:
+        return self._node('var', (), name)
+
+    def const(self, x: Padic | int) -> PadicExpr:
+        if isinstance(x, Padic):
+            if x.p != self.p:
+                raise RuntimeError(f"Can't use {x} in graph of {self.p}-adic expressions")
+            out = self._node('const', (), ('padic', x.N, x.v, x.s))
+        elif isinstance(x, int):
+            out = self._node('const', (), ('int', x))
+        else:
+            raise RuntimeError(f"Can't use {x} in graph of {self.p}-adic expressions")
+        self._constants[out.id] = x
+        return out
+
+    # Values of outputs for given values of variables.
+    def evaluate(self, outputs: list[PadicExpr], bindings: dict[str, Padic | int], digits: int | None = None,
+                 guard_digits: int = 8, max_rounds: int = 6) -> list[Padic]:
+        return self._evaluate(outputs, bindings, digits, guard_digits, max_rounds)
+
+    # Values of outputs for many bindings at once, given as columns: name -> list of values
+    # (or PadicArray). Every operation is done once per node on whole PadicArray.
+    def evaluate_many(self, outputs: list[PadicExpr], bindings: dict[str, list[Padic | int] | PadicArray],
+                      digits: int | None = None, guard_digits: int = 8, max_rounds: int = 6) -> list[PadicArray]:
+        columns = {}
+        for name, values in bindings.items():
+            if not isinstance(values, PadicArray):
+                values = PadicArray.from_padics([x if isinstance(x, Padic) else Padic.from_int(x, self.p)
+                                                 for x in values], self.p)
+            columns[name] = values
+        return self._evaluate(outputs, columns, digits, guard_digits, max_rounds)
+
+    def _evaluate(self, outputs: list[PadicExpr], bindings: dict, digits: int | None,
+                  guard_digits: int, max_rounds: int) -> list:
+        ids = [self._check(x) for x in outputs]
+        order = self._reachable(ids)
+        if digits is None:
+            values = self._run(order, bindings, None)
+            return [values[i] for i in ids]
+        # Valuation bounds (min, max) per node
+        bounds = {i: _val_bounds(self._leaf(i, bindings, None)) for i in order if not self._args[i]}
+        guard = guard_digits
+        for _ in range(max_rounds):
+            need = self._needs(order, ids, digits, bounds)
+            try:
+                values = self._run(order, bindings, {i: n + guard for i, n in need.items()})
+            except (ValueError, ZeroDivisionError):
+                # Division by a number which is zero at current precision
+                guard *= 2
+                continue
+            if all(_min_precision(values[i]) >= digits for i in ids):
+                return [_truncate(values[i], digits) for i in ids]
+            bounds = {i: _val_bounds(x) for i, x in values.items()}
+            guard *= 2
+        raise RuntimeError(f"Couldn't evaluate expressions up to O({self.p}^{digits})")
+
+    def _check(self, x: PadicExpr) -> int:
+        if not isinstance(x, PadicExpr) or x.graph is not self:
+            raise RuntimeError(f"{x} is not an expression of this graph")
+        return x.id
+
+    def _reachable(self, ids: list[int]) -> list[int]:
+        seen = set(ids)
+        for i in range(max(ids, default=-1), -1, -1):
+            if i in seen:
+                seen.update(self._args[i])
+        return sorted(seen)
+
+    def _leaf(self, i: int, bindings: dict, N: int | None) -> Padic | PadicArray:
+        if self._ops[i] == 'const':
+            x = self._constants[i]
+            if isinstance(x, int):
+                return Padic.from_int(x, self.p, N)
+        else:
+            name = self._params[i]
+            if name not in bindings:
+                raise RuntimeError(f"Variable {name} is not bound")
+            x = bindings[name]
+            if isinstance(x, int):
+                return Padic.from_int(x, self.p, N)
+        return x if N is None else _truncate(x, N)
+
+    # Absolute precision needed at each node for outputs to be known up to O(p^digits).
+    def _needs(self, order: list[int], outputs: list[int], digits: int,
+               bounds: dict[int, tuple[int, int]]) -> dict[int, int]:
+        need = {i: digits for i in outputs}
+
+        def up(j: int, n: int) -> None:
+            if need.get(j, n) <= n:
+                need[j] = n
+
+        for i in reversed(order):
+            n = need[i]
+            op, args = self._ops[i], self._args[i]
+            lo = [bounds.get(j, (0, 0))[0] for j in args]
+            hi = [bounds.get(j, (0, 0))[1] for j in args]
+            if op in ('add', 'sub', 'neg', 'exp', 'log'):
+                for j in args:
+                    up(j, n)
+            elif op == 'mul':
+                up(args[0], n - lo[1])
+                up(args[1], n - lo[0])
+            elif op == 'div':
+                up(args[0], n + hi[1])
+                up(args[1], n + 2 * hi[1] - lo[0])
+            elif op == 'pow':
+                k = self._params[i]
+                up(args[0], n - (k - 1) * lo[0] if k > 0 else n + (1 - k) * hi[0])
+        return need
+
+    def _run(self, order: list[int], bindings: dict, precision: dict[int, int] | None) -> dict:
+        values = {}
+        for i in order:
+            op, args = self._ops[i], self._args[i]
+            x = [values[j] for j in args]
+            if not args:
+                values[i] = self._leaf(i, bindings, None if precision is None else precision[i])
+            elif op == 'add':
+                values[i] = x[0] + x[1]
+            elif op == 'sub':
+                values[i] = x[0] - x[1]
+            elif op == 'neg':
+                values[i] = -x[0]
+            elif op == 'mul':
+                values[i] = x[0] * x[1]
+            elif op == 'div':
+                values[i] = x[0] / x[1]
+            elif op == 'pow':
+                values[i] = _power(x[0], self._params[i])
+            else:
+                f = exp if op == 'exp' else log
+                N = None if precision is None else precision[i]
+                if isinstance(x[0], PadicArray):
+                    values[i] = PadicArray.from_padics([f(y, digits=min(N, y.N) if N else y.N) for y in x[0]], self.p)
+                else:
+                    values[i] = f(x[0], digits=min(N, x[0].N) if N else x[0].N)
+        return values
+
+
+# Node of PadicGraph. Arithmetic with other expressions of the same graph, Padic numbers and
+# integers builds new nodes.
+class PadicExpr:
+    __slots__ = ('graph', 'id')
+
+    def __init__(self, graph: PadicGraph, i: int) -> None:
+        self.graph: PadicGraph = graph
+        self.id: int = i
+
+    def _arg(self, other: PadicExpr | Padic | int) -> int:
+        if isinstance(other, PadicExpr):
+            return self.graph._check(other)
+        return self.graph.const(other).id
+
+    # Arguments of commutative operations are sorted, so x + y and y + x are the same node.
+    def _commutative(self, op: str, other: PadicExpr | Padic | int) -> PadicExpr:
+        j = self._arg(other)
+        return self.graph._node(op, (min(self.id, j), max(self.id, j)))
+
+    def __add__(self, other: PadicExpr | Padic | int) -> PadicExpr:
+        return self._commutative('add', other)
+
+    def __radd__(self, other: Padic | int) -> PadicExpr:
+        return self._commutative('add', other)
+
+    def __mul__(self, other: PadicExpr | Padic | int) -> PadicExpr:
+        return self._commutative('mul', other)
+
+    def __rmul__(self, other: Padic | int) -> PadicExpr:
+        return self._commutative('mul', other)
+
+    def __sub__(self, other: PadicExpr | Padic | int) -> PadicExpr:
+        return self.graph._node('sub', (self.id, self._arg(other)))
+
+    def __rsub__(self, other: Padic | int) -> PadicExpr:
+        return self.graph._node('sub', (self._arg(other), self.id))
+
+    def __neg__(self) -> PadicExpr:
+        return self.graph._node('neg', (self.id,))
+
+    def __truediv__(self, other: PadicExpr | Padic | int) -> PadicExpr:
+        return self.graph._node('div', (self.id, self._arg(other)))
+
+    def __rtruediv__(self, other: Padic | int) -> PadicExpr:
+        return self.graph._node('div', (self._arg(other), self.id))
+
+    def __pow__(self, power: int) -> PadicExpr:
+        assert isinstance(power, int)
+        if power == 0:
+            return self.graph.const(1)
+        if power == 1:
+            return self
+        return self.graph._node('pow', (self.id,), power)
+
+    def exp(self) -> PadicExpr:
+        return self.graph._node('exp', (self.id,))
+
+    def log(self) -> PadicExpr:
+        return self.graph._node('log', (self.id,))
+
+    def __repr__(self) -> str:
+        return f"PadicExpr({self.graph._ops[self.id]} #{self.id})"
+
+
+# Square-and-multiply working for Padic and PadicArray alike.
+def _power(x: Padic | PadicArray, k: int) -> Padic | PadicArray:
+    out = None
+    base = x
+    m = abs(k)
+    while m:
+        if m & 1:
+            out = base if out is None else out * base
+        m >>= 1
+        if m:
+            base = base * base
+    return 1 / out if k < 0 else out
+
+
+def _val_bounds(x: Padic | PadicArray) -> tuple[int, int]:
+    if isinstance(x, PadicArray):
+        return (min(x.v), max(x.v)) if len(x) else (0, 0)
+    return x.v, x.v
+
+
+def _min_precision(x: Padic | PadicArray) -> int | float:
+    if isinstance(x, PadicArray):
+        return min(x.N, default=float('inf'))
+    return x.N
+
+
+def _truncate(x: Padic | PadicArray, N: int) -> Padic | PadicArray:
+    if isinstance(x, PadicArray):
+        return PadicArray([min(n, N) for n in x.N], x.v, x.s, x.p)
+    return x.with_precision(N) if x.N > N else x
+
+
+# Settings of Padic class that worker processes have to share with the parent one,
+# so that parallel results are the same as sequential ones.
+def _padic_settings() -> tuple[int, int, int | None, int | None, int | None, int, str]:
+    return (Padic.PRECISION, Padic.INTEGER_PRECISION, Padic.DEFAULT_PRIME, Padic.DISPLAY_PRECISION,
+            Padic.TARGET_PRECISION, Padic.GUARD_DIGITS, _backend)
+
+
+def _init_worker(settings: tuple[int, int, int | None, int | None, int | None, int, str]) -> None:
+    (Padic.PRECISION, Padic.INTEGER_PRECISION, Padic.DEFAULT_PRIME, Padic.DISPLAY_PRECISION,
+     Padic.TARGET_PRECISION, Padic.GUARD_DIGITS, backend) = settings
+    set_backend(backend)
+
+
+def _apply_chunk(f: Callable, chunk: list[tuple], kwargs: dict) -> list:
+    return [f(*args, **kwargs) for args in chunk]
+
+
+# Computes [f(*args, **kwargs) for args in arguments] in a pool of processes, sending arguments in chunks.
+# f has to be a module level function. If processes is None number of CPUs is used, if it is 1 no
+# pool is created. By default each process gets about 4 chunks.
+def parallel_map(f: Callable, arguments: list[tuple], processes: int | None = None, chunksize: int | None = None,
+                 **kwargs) -> list:
+    from concurrent.futures import ProcessPoolExecutor
+    from os import cpu_count
+    arguments = list(arguments)
+    if processes is None:
+        processes = cpu_count() or 1
+    if processes == 1 or len(arguments) <= 1:
+        return _apply_chunk(f, arguments, kwargs)
+    if chunksize is None:
+        chunksize = max(1, -(-len(arguments) // (4 * processes)))
+    chunks = [arguments[i:i + chunksize] for i in range(0, len(arguments), chunksize)]
+    with ProcessPoolExecutor(processes, initializer=_init_worker, initargs=(_padic_settings(),)) as pool:
+        return [y for ys in pool.map(_apply_chunk, [f] * len(chunks), chunks, [kwargs] * len(chunks)) for y in ys]
+
+
+# exp of every element of xs, computed in parallel. Same arguments as exp.
+def map_exp(xs: list[int | Padic], p: int | None = None, digits: int | None = None, N: int = 100,
+            processes: int | None = None, chunksize: int | None = None) -> list[Padic]:
+    return parallel_map(exp, [(x,) for x in xs], processes, chunksize, p=p, N=N, digits=digits)
+
+
+# log of every element of xs, computed in parallel. Same arguments as log.
+def map_log(xs: list[int | Padic], p: int | None = None, digits: int | None = None, N: int = 100,
+            processes: int | None = None, chunksize: int | None = None) -> list[Padic]:
+    return parallel_map(log, [(x,) for x in xs], processes, chunksize, p=p, N=N, digits=digits)
+
+
+# hensel for every polynomial and respective approximate root, computed in parallel.
+def hensel_many(polys: list[Polynomial | PadicPolynomial], approxs: list[Padic | int | None] | None = None,
+                p: int | None = None, N: int = 100, digits: int | None = None, processes: int | None = None,
+                chunksize: int | None = None) -> list[Padic]:
+    polys = [_as_padic_polynomial(poly, p) for poly in polys]
+    if approxs is None:
+        approxs = [None] * len(polys)
+    return parallel_map(hensel, list(zip(polys, approxs)), processes, chunksize, p=p, N=N, digits=digits)
+
+
+# Multi-prime evaluation: the same rational value or polynomial in Q_p for many primes at once,
+# returned as dicts {p: result}. Work that doesn't depend on p is done once. Integers much bigger
+# than the moduli p^N are reduced with a remainder tree: modulo the product of all p^N first and
+# then modulo products over halves, quarters, ... of the primes, which costs a few operations on
+# numbers of their size instead of a long division per prime. Results are exactly the same as
+# of the respective function called for every prime separately.
+
+# Levels of products of pairs of moduli, starting with moduli themselves. Stops before products
+# get longer than bits, reducing modulo bigger ones would gain nothing.
+def _product_tree(moduli: list[int], bits: int) -> list[list[int]]:
+    levels = [moduli]
+    while len(levels[-1]) > 1 and 2 * max(m.bit_length() for m in levels[-1]) <= bits:
+        prev = levels[-1]
+        levels.append([prev[i] * prev[i + 1] if i + 1 < len(prev) else prev[i] for i in range(0, len(prev), 2)])
+    return levels
+
+
+# a % m for every modulus m at the bottom of the tree.
+def _remainders(a: int, tree: list[list[int]]) -> list[int]:
+    out = [a % m for m in tree[-1]]
+    for level in reversed(tree[:-1]):
+        out = [out[i // 2] % m for i, m in enumerate(level)]
+    return out
+
+
+# Residues of every value modulo every modulus (as list per value). Tree is built only if some
+# value is much longer than the moduli, otherwise direct reduction is as fast.
+def _residues(values: list[int], moduli: list[int]) -> list[list[int]]:
+    bits = 64 * max((m.bit_length() for m in moduli), default=0)
+    if all(a.bit_length() <= bits for a in values):
+        return [[a % m for m in moduli] for a in values]
+    tree = _product_tree(moduli, max(a.bit_length() for a in values))
+    return [_remainders(a, tree) if a.bit_length() > bits else [a % m for m in moduli] for a in values]
+
+
+# Padic.from_frac(a, b, p, N) for every p in primes. from_int(a, p, N) depends only on a mod p^N,
+# so numerator and denominator are reduced by the remainder tree and divided per prime.
+def from_frac_by_prime(a: int, b: int, primes: list[int], N: int | None = None) -> dict[int, Padic]:
+    if N is None:
+        N = Padic.INTEGER_PRECISION
+    primes = list(primes)
+    num, den = _residues([a, b], [p ** N for p in primes])
+    out = {}
+    for p, ra, rb in zip(primes, num, den):
+        if rb == 0:
+            raise RuntimeError(f"Can't divide by denominator equal to 0 + O({p}^{N})")
+        e1, ra = _remove(ra, p) if ra else (N, 0)
+        e2, rb = _remove(rb, p)
+        n = _capped(min(e1 - 2 * e2, -e2) + N)
+        e = e1 - e2
+        if e >= n or ra == 0:
+            out[p] = Padic._make(n, n, 0, p)
+        else:
+            m = p ** (n - e)
+            out[p] = Padic._make(n, e, _mulmod(ra, _invert(rb, m), m), p)
+    return out
+
+
+# Exact binary splitting of sum of c^n/(n b^n) for lo <= n < hi. Returns P, B, Q, T such that
+# P = c^(hi-lo), B = b^(hi-lo), Q = lo(lo+1)...(hi-1) and the sum equals T/(QB) * (c/b)^(lo-1).
+def _log_split(c: int, b: int, lo: int, hi: int) -> tuple[int, int, int, int]:
+    if hi - lo == 1:
+        return c, b, lo, c
+    mid = (lo + hi) // 2
+    P1, B1, Q1, T1 = _log_split(c, b, lo, mid)
+    P2, B2, Q2, T2 = _log_split(c, b, mid, hi)
+    return P1 * P2, B1 * B2, Q1 * Q2, T1 * Q2 * B2 + P1 * T2 * Q1
+
+
+# log(x, digits=digits) of rational x (int, Rational or Fraction) for every p in primes. Like log
+# it raises for primes p for which x isn't 1 + O(p). log(a/b) = -sum c^n/(n b^n) with c = b - a is
+# summed exactly once by binary splitting as T/(QB) with as many terms as the slowest prime needs.
+# T and QB are reduced modulo p^(digits + v(Q)) by the remainder tree and divided once per prime.
+def log_by_prime(x: int | Rational | Fraction, primes: list[int], digits: int = 100) -> dict[int, Padic]:
+    a, b = Rational._parts(x)
+    g = _math_gcd(a, b) or 1
+    a, b = a // g, b // g
+    digits = _capped(digits)
+    precision, terms = {}, 1
+    for p, y in from_frac_by_prime(a, b, primes, digits).items():
+        v = Padic.val(y - 1)
+        if v < 1:
+            raise RuntimeError(f"Series doesn't converge at {1 - y}")
+        n = precision[p] = min(digits, y.N)
+        k = 1
+        while k * min(v, n) - _ilog(k, p) < n:
+            k += 1
+        terms = max(terms, k)
+    if terms == 1:
+        return {p: Padic._make(n, n, 0, p) for p, n in precision.items()}
+    # b isn't divisible by any p here (x = a/b is reduced and 1 + O(p)), so v(QB) = v((terms-1)!)
+    w = {p: _factorial_val(terms - 1, p) for p in precision}
+    _, B, Q, T = _log_split(b - a, b, 1, terms)
+    num, den = _residues([T, Q * B], [p ** (n + w[p]) for p, n in precision.items()])
+    out = {}
+    for (p, n), rt, rq in zip(precision.items(), num, den):
+        e, u = _remove(rt, p) if rt else (n + w[p], 0)
+        e -= w[p]
+        if e >= n:
+            out[p] = Padic._make(n, n, 0, p)
+        else:
+            m = p ** (n - e)
+            out[p] = Padic._make(n, e, -_mulmod(u, _invert(_remove(rq, p)[1], m), m) % m, p)
     return out